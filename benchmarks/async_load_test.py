@@ -0,0 +1,166 @@
+"""
+Load test of the asyncio query facade (AsyncEnergyData) behind a local stand-in HTTP server.
+The server answers GET /aggregate?metric=...&granularity=...&year=... with the JSON of EnergyDataDB.aggregate,
+either calling the database directly on the event loop ('blocking') or through the facade ('async').
+A few hundred clients send their requests at once, drawn from a small set of distinct queries, and the
+p50/p99 latency is reported per mode. The query cache is disabled unless --cache is given, so identical
+requests are served by coalescing. Finally a burst of queries is cancelled to check that the facade
+drops or interrupts them.
+
+Run from the repository root:
+    python -m benchmarks.async_load_test [--requests N] [--years YEARS] [--workers N] [--cache]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from benchmarks.db_load_benchmark import synthetic_processed_data
+from src.data_cache import QueryResultCache
+from src.db_async import AsyncEnergyData
+from src.data_storage import storage_path, write_frame
+from src.db_loader import EnergyDataDB
+
+GRANULARITIES = ('hourly', 'daily', 'weekly', 'monthly')  # Granularities of the requested aggregates
+METRICS = ('consumption', 'temperature_average')          # Metrics of the requested aggregates
+
+
+class StandInServer:
+    """
+    Minimal HTTP/1.1 server on 127.0.0.1 serving the aggregates of a database, one request per connection.
+    Attributes:
+        query: Coroutine function (metric, granularity, year) -> pd.DataFrame answering the requests.
+        port (int): Port of the running server.
+    """
+    def __init__(self, query):
+        self.query = query
+        self.port = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        request_line = (await reader.readline()).decode('ascii')
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        try:
+            url = urlsplit(request_line.split()[1])
+            params = {name: values[0] for name, values in parse_qs(url.query).items()}
+            data = await self.query(params['metric'], params['granularity'], int(params['year']))
+            status, body = '200 OK', data.reset_index().to_json(orient='split', date_format='iso').encode('utf-8')
+        except Exception as error:  # Reported to the client as a server error
+            status, body = '500 Internal Server Error', str(error).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode('ascii') + body)
+        await writer.drain()
+        writer.close()
+
+
+async def request(port, path) -> tuple:
+    """
+    Sends one GET request and returns its status code and latency in seconds.
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode('ascii'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    return int(response.split(b' ', 2)[1]), time.perf_counter() - start
+
+
+async def load(port, paths) -> tuple:
+    """
+    Sends all requests at once, returns the latencies and the wall time.
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request(port, path) for path in paths))
+    elapsed = time.perf_counter() - start
+    failed = [status for status, _ in results if status != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed.")
+
+    return np.array([latency for _, latency in results]), elapsed
+
+
+async def run_mode(mode, database, paths, workers) -> None:
+    facade = AsyncEnergyData(database, max_workers=workers)
+    if mode == 'blocking':
+        async def query(metric, granularity, year):
+            return database.aggregate(metric, granularity, filters={'year' if granularity != 'weekly' else 'iso_year': year})
+    else:
+        async def query(metric, granularity, year):
+            return await facade.aggregate(metric, granularity, filters={'year' if granularity != 'weekly' else 'iso_year': year})
+
+    server = StandInServer(query)
+    await server.start()
+    latencies, elapsed = await load(server.port, paths)
+    await server.stop()
+    facade.close()
+
+    stats = facade.stats() if mode == 'async' else {'queries': len(paths), 'coalesced': 0}
+    print(f"{mode:>8} {len(paths):>8} {np.percentile(latencies, 50) * 1000:>8.1f} {np.percentile(latencies, 99) * 1000:>8.1f} "
+          f"{len(paths) / elapsed:>8.0f} {stats['queries']:>8} {stats['coalesced']:>9}")
+
+
+async def run_cancellation(database, years, workers) -> None:
+    """
+    Starts one distinct hourly query per year and month, cancels all of them and waits until the facade is idle.
+    """
+    facade = AsyncEnergyData(database, max_workers=workers)
+    tasks = [asyncio.ensure_future(facade.aggregate(list(METRICS), 'hourly', filters={'year': year, 'month': month}))
+             for year in years for month in range(1, 13)]
+    await asyncio.sleep(0.005)
+    start = time.perf_counter()
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.get_running_loop().run_in_executor(None, facade.close)
+    stats = facade.stats()
+    print(f"Cancelled {len(tasks)} requests: {stats['cancelled']} of {stats['queries']} queries dropped or interrupted, "
+          f"{sum(not isinstance(result, BaseException) for result in results)} answered, "
+          f"facade idle after {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--cache', action='store_true', help='Keep the query cache of the database enabled.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = storage_path(os.path.join(directory, 'merged_data.csv'))
+        data = synthetic_processed_data(args.years * 365 * 24)
+        write_frame(data, csv_path)
+        years = sorted(set(data.index.year))
+        database = EnergyDataDB(db_path=os.path.join(directory, 'database.db'), csv_path=csv_path)
+        if not args.cache:
+            database.query_cache = QueryResultCache(max_entries=0)
+
+        rng = random.Random(0)
+        paths = [f"/aggregate?metric={rng.choice(METRICS)}&granularity={rng.choice(GRANULARITIES)}&year={rng.choice(years)}"
+                 for _ in range(args.requests)]
+        print(f"{len(set(paths))} distinct queries, {args.workers} workers, query cache {'on' if args.cache else 'off'}")
+        print(f"{'mode':>8} {'requests':>8} {'p50 [ms]':>8} {'p99 [ms]':>8} {'req/s':>8} {'queries':>8} {'coalesced':>9}")
+        for mode in ('blocking', 'async'):
+            asyncio.run(run_mode(mode, database, paths, args.workers))
+        asyncio.run(run_cancellation(database, years, args.workers))
+        database.close()
+
+
+if __name__ == '__main__':
+    main()
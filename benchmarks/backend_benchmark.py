@@ -0,0 +1,80 @@
+"""
+Benchmark of the storage backends of the EnergyDataDB query surface: SQLite with rollup tables (EnergyDataDB)
+and a Parquet dataset partitioned by year/month (ParquetEnergyData), on 1, 10 and 30 years of synthetic
+hourly data. Reports the load time and the median time of every query with the query caches disabled.
+
+Run from the repository root:
+    python -m benchmarks.backend_benchmark [years ...] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.db_load_benchmark import synthetic_processed_data
+from src.data_cache import QueryResultCache
+from src.data_storage import storage_path, write_frame
+from src.db_loader import EnergyDataDB
+from src.db_parquet import ParquetEnergyData
+
+YEARS = (1, 10, 30)
+
+
+def queries(year) -> dict:
+    """
+    Returns the benchmarked queries by name, 'year' is the year used in the filters.
+    """
+    return {
+        'yearly avg': lambda database: database.get_average_consumption_per_year(),
+        'monthly 2 metrics': lambda database: database.aggregate(
+            ['consumption', 'temperature_average'], 'monthly', agg={'consumption': 'sum', 'temperature_average': 'avg'}),
+        'weekly avg': lambda database: database.get_average_consumption_per_week(),
+        'daily of a year': lambda database: database.aggregate('consumption', 'daily', filters={'year': year}),
+        'hourly of a month': lambda database: database.get_consumption_per_hour(year=year, month=6),
+    }
+
+
+def measure(query, database, repeat) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query(database)
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('years', nargs='*', type=int, default=YEARS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'years':>5} {'query':<18} {'sqlite [ms]':>12} {'parquet [ms]':>13}")
+    for years in args.years:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = storage_path(os.path.join(directory, 'merged_data.csv'))
+            data = synthetic_processed_data(years * 365 * 24)
+            write_frame(data, csv_path)
+
+            backends = {}
+            load_times = {}
+            for name, open_backend in (
+                    ('sqlite', lambda: EnergyDataDB(db_path=os.path.join(directory, 'database.db'), csv_path=csv_path)),
+                    ('parquet', lambda: ParquetEnergyData(dataset_path=os.path.join(directory, 'energy_data'), csv_path=csv_path))):
+                start = time.perf_counter()
+                backends[name] = open_backend()
+                load_times[name] = time.perf_counter() - start
+                backends[name].query_cache = QueryResultCache(max_entries=0)
+
+            print(f"{years:>5} {'load':<18} {load_times['sqlite'] * 1000:>12.1f} {load_times['parquet'] * 1000:>13.1f}")
+            for name, query in queries(data.index.year[len(data) // 2]).items():
+                sqlite_time = measure(query, backends['sqlite'], args.repeat)
+                parquet_time = measure(query, backends['parquet'], args.repeat)
+                print(f"{years:>5} {name:<18} {sqlite_time * 1000:>12.2f} {parquet_time * 1000:>13.2f}")
+            backends['sqlite'].close()
+
+
+if __name__ == '__main__':
+    main()
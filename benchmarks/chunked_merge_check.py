@@ -0,0 +1,106 @@
+"""
+Checks that ProcessedData.process_in_chunks writes the same merged data as the merge of the whole history
+(ProcessedData.merge_raw_data) for every chunk size, so also for the sizes whose chunk boundaries split
+the hour skipped when DST starts, the hour repeated when DST ends or a gap.
+The synthetic raw data covers both DST transitions of 2023 in local wall-clock time, with short and long
+consumption gaps, missing values and missing or duplicate external hours. The repair stage is checked
+enabled (MAX_FILL_GAP) and disabled. Exits with status 1 on a failed check.
+
+Run from the repository root:
+    python -m benchmarks.chunked_merge_check [--max-chunksize N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.data_loader import SOURCES, RawData
+from src.data_processing import MAX_FILL_GAP, ProcessedData
+from src.data_storage import read_frame, storage_path, write_frame
+
+WINDOWS = (('2023-03-24', '2023-03-29'), ('2023-10-27', '2023-11-01'))  # Days around the DST transitions
+STATIONS = ['Praha', 'Plzen', 'Liberec', 'Ceske_Budejovice']
+
+
+def write_synthetic_sources(directory) -> pd.DatetimeIndex:
+    """
+    Writes the raw consumption file and the external files of the DST windows below 'directory'
+    (at their SOURCES paths, the external ones in the storage format) and the processed data folder. Returns the wall-clock timestamps of the consumption rows.
+    """
+    for folder in ('raw', 'external', 'processed'):
+        os.makedirs(os.path.join(directory, 'data', folder), exist_ok=True)
+    rng = np.random.default_rng(0)
+    local = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(start, end, freq='h', tz='Europe/Prague', inclusive='left').tz_localize(None)
+        for start, end in WINDOWS]))
+    # 02:00 is missing on 2023-03-26 and repeated on 2023-10-29, drop short and long gaps around them
+    consumption = pd.DataFrame({'Values': rng.normal(7000, 1000, len(local))}, index=local)
+    dropped = [f'2023-03-25 {hour:02}:00' for hour in (5, 6)] + [f'2023-03-27 {hour:02}:00' for hour in range(8, 13)]
+    consumption = consumption[~consumption.index.isin(pd.DatetimeIndex(dropped + ['2023-10-30 03:00']))]
+    consumption.iloc[[40, 41, 150, 200]] = np.nan
+
+    path = os.path.join(directory, SOURCES['consumption']['path'])
+    dates = consumption.index.strftime('%d.%m.%Y ') + consumption.index.hour.astype(str) + consumption.index.strftime(':%M')
+    pd.DataFrame({'Date': dates, 'Values': consumption['Values']}).to_csv(path, sep=';', index=False)
+
+    hours = pd.DatetimeIndex(np.concatenate([pd.date_range(start, end, freq='h', inclusive='left') for start, end in WINDOWS]),
+                             name='time')
+    for name in ('temperature', 'solar', 'wind'):
+        data = pd.DataFrame(rng.normal(10, 5, (len(hours), len(STATIONS))).round(1), index=hours, columns=STATIONS)
+        data['average'] = data.mean(axis=1)
+        data = data.drop(hours[[10, 11, 100]])
+        if name == 'temperature':
+            data = pd.concat([data.iloc[:60], data.iloc[59:60] + 1, data.iloc[60:]])
+        write_frame(data, storage_path(os.path.join(directory, SOURCES[name]['path'])))
+    calendar = pd.DataFrame({'day_of_week': hours.dayofweek, 'is_weekend': hours.dayofweek >= 5, 'is_holiday': False}, index=hours)
+    write_frame(calendar.drop(hours[[30, 31]]), storage_path(os.path.join(directory, SOURCES['calendar']['path'])))
+
+    return consumption.index
+
+
+def merged_data(**kwargs) -> pd.DataFrame:
+    """
+    Processes the raw data of the working directory and returns the stored merged data.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        ProcessedData(RawData(lazy=True, parse_cache=False), **kwargs)
+    return read_frame(storage_path('data/processed/merged_data.csv'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-chunksize', type=int, default=None, help='Largest chunk size checked (all rows by default).')
+    args = parser.parse_args()
+
+    failures = 0
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        index = write_synthetic_sources(directory)
+        os.chdir(directory)
+        try:
+            for max_gap in (MAX_FILL_GAP, None):
+                expected = merged_data(max_gap=max_gap)
+                for chunksize in range(1, (args.max_chunksize or len(index)) + 1):
+                    streamed = merged_data(max_gap=max_gap, chunksize=chunksize)
+                    try:
+                        pd.testing.assert_frame_equal(streamed, expected)
+                    except AssertionError as error:
+                        failures += 1
+                        print(f"FAIL max_gap={max_gap} chunksize={chunksize}: {str(error).splitlines()[0]}")
+                print(f"max_gap={max_gap}: {len(expected)} merged rows, chunk sizes 1 to {chunksize} checked")
+        finally:
+            os.chdir(cwd)
+
+    if failures:
+        print(f"{failures} chunk sizes failed the check.")
+        sys.exit(1)
+    print("The streamed merged data equals the merge of the whole history for all chunk sizes.")
+
+
+if __name__ == '__main__':
+    main()
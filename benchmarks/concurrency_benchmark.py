@@ -0,0 +1,101 @@
+"""
+Benchmark of concurrent reads from EnergyDataDB while an ingest is running.
+A synthetic database is queried by 1, 2, 4 and 8 threads, each on its own read-only WAL connection,
+while a writer thread keeps upserting the last weeks of data through the single writer connection.
+The query cache is disabled, so every query reads the database. Reports queries per second
+with and without the running ingest.
+
+Run from the repository root:
+    python -m benchmarks.concurrency_benchmark [--years YEARS] [--seconds SECONDS] [--threads N ...]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.db_load_benchmark import synthetic_processed_data
+from src.data_cache import QueryResultCache
+from src.data_storage import storage_path, write_frame
+from src.db_loader import EnergyDataDB
+
+THREADS = (1, 2, 4, 8)
+INGEST_ROWS = 24 * 28  # Hours upserted by every ingest of the writer thread
+
+
+def run_query(database, rng, years) -> None:
+    """
+    Runs one query of the analysis mix with random filters.
+    """
+    year = rng.choice(years)
+    kind = rng.randrange(3)
+    if kind == 0:
+        database.aggregate(['consumption', 'temperature_average'], 'daily', filters={'year': year},
+                           agg={'consumption': 'sum', 'temperature_average': 'avg'})
+    elif kind == 1:
+        database.get_consumption_per_hour(year=year, month=rng.randint(1, 12))
+    else:
+        database.aggregate(['consumption', 'solar_average', 'wind_average'], 'monthly', agg=['min', 'max'])
+
+
+def measure(database, threads, seconds, years, ingest) -> tuple:
+    """
+    Runs 'threads' reader threads for 'seconds', optionally with a writer thread ingesting the tail of the data.
+    Returns the number of queries and ingests.
+    """
+    stop = threading.Event()
+    queries = [0] * threads
+    ingests = [0]
+    tail = synthetic_processed_data(len(years) * 365 * 24).tail(INGEST_ROWS)
+
+    def reader(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            run_query(database, rng, years)
+            queries[number] += 1
+
+    def writer():
+        while not stop.is_set():
+            database.bulk_load(tail)
+            ingests[0] += 1
+
+    workers = [threading.Thread(target=reader, args=(number,)) for number in range(threads)]
+    if ingest:
+        workers.append(threading.Thread(target=writer))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    return sum(queries), ingests[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--threads', nargs='*', type=int, default=THREADS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = storage_path(os.path.join(directory, 'merged_data.csv'))
+        data = synthetic_processed_data(args.years * 365 * 24)
+        write_frame(data, csv_path)
+        years = sorted(set(data.index.year))
+        database = EnergyDataDB(db_path=os.path.join(directory, 'database.db'), csv_path=csv_path)
+        database.query_cache = QueryResultCache(max_entries=0)
+
+        print(f"{os.cpu_count()} CPUs, {len(data)} hours, {args.seconds:.0f} s per run")
+        print(f"{'threads':>7} {'ingest':>6} {'queries/s':>10} {'ingests':>8}")
+        for threads in args.threads:
+            for ingest in (False, True):
+                queries, ingests = measure(database, threads, args.seconds, years, ingest)
+                print(f"{threads:>7} {'yes' if ingest else 'no':>6} {queries / args.seconds:>10.1f} {ingests:>8}")
+        database.close()
+
+
+if __name__ == '__main__':
+    main()
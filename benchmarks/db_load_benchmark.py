@@ -0,0 +1,126 @@
+"""
+Benchmark of the EnergyDataDB ingestion of the processed CSV file.
+Compares the former row-by-row loader (csv.DictReader, strptime and float() per field, one executemany)
+with the bulk loader (column-wise pandas parsing, vectorized calendar fields, one transaction with tuned pragmas)
+on synthetic processed data, in rows per second. Both start from an empty database.
+
+Run from the repository root:
+    python -m benchmarks.db_load_benchmark [rows ...] [--legacy-max ROWS]
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src import data_storage
+from src.db_loader import EnergyDataDB
+
+ROWS = (10_000, 1_000_000, 10_000_000)
+
+
+def synthetic_processed_data(rows) -> pd.DataFrame:
+    """
+    Builds a frame shaped like the processed merged data with 'rows' hours.
+    """
+    index = pd.date_range('1900-01-01', periods=rows, freq='h', unit='s', name='datetime')
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'consumption': rng.normal(7000, 1000, rows).astype('float32'),
+        'temperature_average': rng.normal(10, 8, rows).astype('float32'),
+        'solar_average': rng.uniform(0, 60, rows).astype('float32'),
+        'wind_average': rng.uniform(0, 40, rows).astype('float32'),
+        'day_of_week': index.dayofweek.astype('int8')
+    }, index=index)
+    data['is_weekend'] = data['day_of_week'] >= 5
+    data['is_holiday'] = False
+
+    return data
+
+
+def legacy_load(db_path, csv_path) -> None:
+    """
+    The former EnergyDataDB.create_table and load_csv.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS energy_data (
+        datetime TEXT PRIMARY KEY,
+        year INTEGER,
+        month INTEGER,
+        day INTEGER,
+        hour INTEGER,
+        consumption REAL,
+        temperature_average REAL,
+        solar_average REAL,
+        wind_average REAL,
+        day_of_week INTEGER,
+        is_weekend BOOLEAN,
+        is_holiday BOOLEAN
+    )
+    """)
+    with open(csv_path, newline='', encoding="utf-8") as f:
+        reader = csv.DictReader(f, delimiter=';')
+        rows = []
+        for row in reader:
+            dt = datetime.strptime(row["datetime"], "%Y-%m-%d %H:%M:%S")
+            rows.append((
+                row["datetime"], dt.year, dt.month, dt.day, dt.hour,
+                float(row["consumption"]), float(row["temperature_average"]),
+                float(row["solar_average"]), float(row["wind_average"]),
+                int(row["day_of_week"]), row["is_weekend"] == "True", row["is_holiday"] == "True"
+            ))
+    c.executemany("""
+    INSERT OR REPLACE INTO energy_data
+    (datetime, year, month, day, hour, consumption, temperature_average, solar_average, wind_average, day_of_week, is_weekend, is_holiday)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def bulk_load(db_path, csv_path) -> None:
+    EnergyDataDB(db_path=db_path, csv_path=csv_path).close()
+
+
+def measure(load, directory, csv_path) -> float:
+    db_path = os.path.join(directory, f'{load.__name__}.db')
+    start = time.perf_counter()
+    load(db_path, csv_path)
+    elapsed = time.perf_counter() - start
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('rows', nargs='*', type=int, default=ROWS)
+    parser.add_argument('--legacy-max', type=int, default=None,
+                        help='Skip the row-by-row loader above this many rows (it keeps every row as a tuple in memory).')
+    args = parser.parse_args()
+    # Both loaders read the processed CSV file
+    data_storage.set_storage_format('csv')
+
+    print(f"{'rows':>10} {'loader':>8} {'time [s]':>9} {'rows/s':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'merged_data.csv')
+            synthetic_processed_data(rows).to_csv(csv_path, sep=';')
+            for name, load in (('legacy', legacy_load), ('bulk', bulk_load)):
+                if name == 'legacy' and args.legacy_max is not None and rows > args.legacy_max:
+                    continue
+                elapsed = measure(load, directory, csv_path)
+                print(f"{rows:>10} {name:>8} {elapsed:>9.2f} {rows / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
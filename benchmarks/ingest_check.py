@@ -0,0 +1,158 @@
+"""
+Checks the incremental ingestion of the processed data file (EnergyDataQueries.ingest) by both storage backends.
+After every change of the file (appended rows, reprocessed last hours, a shortened file, a corrected older row)
+the data loaded incrementally has to equal the data of a backend loaded from scratch, for CSV and Parquet files.
+A file loaded in chunks ending at midnight, and an all-midnight chunk loaded with bulk_load, have to keep
+their timestamps as 'YYYY-MM-DD HH:MM:SS' so the next ingest can reload from them.
+Exits with status 1 on a failed check.
+
+Run from the repository root:
+    python -m benchmarks.ingest_check
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.db_load_benchmark import synthetic_processed_data
+from src import data_storage, db_loader
+from src.db_loader import ROLLUPS, EnergyDataDB
+
+try:
+    from src.db_parquet import ParquetEnergyData
+    import pyarrow  # noqa: F401
+except ImportError:  # The Parquet backend and files are checked only with pyarrow installed
+    ParquetEnergyData = None
+
+STEPS = {  # Changes of the processed data file, each followed by an ingest
+    'append 50 hours': lambda data: pd.concat([data, synthetic_processed_data(len(data) + 50).iloc[len(data):]]),
+    'reprocess last 10 hours': lambda data: data.assign(
+        consumption=np.where(np.arange(len(data)) >= len(data) - 10, data['consumption'] + 1, data['consumption'])),
+    'drop last 10 hours': lambda data: data.iloc[:-10],
+    'correct an older hour': lambda data: data.assign(
+        consumption=np.where(np.arange(len(data)) == 100, data['consumption'] + 5, data['consumption'])),
+    'drop last 800 hours': lambda data: data.iloc[:-800],
+    'append 30 hours': lambda data: pd.concat([data, synthetic_processed_data(len(data) + 30).iloc[len(data):]]),
+}
+
+
+def quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def sqlite_content(database) -> dict:
+    tables = ['energy_data'] + [f'rollup_{granularity}' for granularity in ROLLUPS]
+    return {table: pd.read_sql_query(f"SELECT * FROM {table} ORDER BY 1, 2, 3", database.conn) for table in tables}
+
+
+def parquet_content(database) -> dict:
+    return {'dataset': database._dataset().to_table().to_pandas().sort_values('epoch').reset_index(drop=True)}
+
+
+def backends(directory) -> dict:
+    """
+    Returns the checked backends by name as (open(name, path), content(database)) pairs.
+    """
+    result = {'sqlite': (lambda name, path: EnergyDataDB(db_path=os.path.join(directory, f'{name}.db'), csv_path=path),
+                         sqlite_content)}
+    if ParquetEnergyData is not None:
+        result['parquet'] = (lambda name, path: ParquetEnergyData(dataset_path=os.path.join(directory, name), csv_path=path),
+                             parquet_content)
+    return result
+
+
+def compare(name, database, reference, content) -> int:
+    try:
+        for table, expected in content(reference).items():
+            pd.testing.assert_frame_equal(content(database)[table], expected, check_exact=False, rtol=1e-9)
+    except AssertionError as error:
+        print(f"FAIL {name}: {str(error).splitlines()[0]}")
+        return 1
+    print(f"ok   {name}")
+    return 0
+
+
+def check_steps(directory, backend, open_backend, content, file_format) -> int:
+    """
+    Ingests every change of STEPS into one backend and compares it with a backend loaded from scratch.
+    """
+    path = os.path.join(directory, f'merged_data.{file_format}')
+    data = synthetic_processed_data(24 * 120)
+    data_storage.write_frame(data, path)
+    database = quiet(open_backend, f'{backend}-{file_format}', path)
+    failures = 0
+    for number, (step, change) in enumerate(STEPS.items()):
+        data = change(data)
+        data_storage.write_frame(data, path)
+        quiet(database.load_data, path)
+        reference = quiet(open_backend, f'{backend}-{file_format}-reference-{number}', path)
+        failures += compare(f"{backend} {file_format}: {step}", database, reference, content)
+        if backend == 'sqlite':
+            reference.close()
+    if backend == 'sqlite':
+        database.close()
+
+    return failures
+
+
+def check_midnight_chunks(directory) -> int:
+    """
+    Loads a file whose last bulk chunk holds only its last hour (midnight) and bulk-loads an all-midnight
+    chunk, then appends rows and ingests again.
+    """
+    failures = 0
+    path = os.path.join(directory, 'midnight.csv')
+    data = synthetic_processed_data(24 * 20 + 1)
+    data_storage.write_frame(data, path)
+    chunk_rows = db_loader.BULK_CHUNK_ROWS
+    db_loader.BULK_CHUNK_ROWS = 24
+    try:
+        database = quiet(EnergyDataDB, db_path=os.path.join(directory, 'midnight.db'), csv_path=path)
+        quiet(database.bulk_load, data[data.index.hour == 0].iloc[-3:])
+        stored = database.last_loaded_hour()
+        if stored != str(data.index[-1]):
+            print(f"FAIL midnight chunks: last loaded hour stored as {stored!r}")
+            failures += 1
+
+        data = STEPS['append 50 hours'](data)
+        data_storage.write_frame(data, path)
+        try:
+            quiet(database.load_data, path)
+        except ValueError as error:
+            print(f"FAIL midnight chunks: ingest after an all-midnight chunk raised {error}")
+            database.close()
+            return failures + 1
+    finally:
+        db_loader.BULK_CHUNK_ROWS = chunk_rows
+    reference = quiet(EnergyDataDB, db_path=os.path.join(directory, 'midnight-reference.db'), csv_path=path)
+    failures += compare("sqlite csv: ingest after all-midnight chunks", database, reference, sqlite_content)
+    database.close()
+    reference.close()
+
+    return failures
+
+
+def main():
+    failures = 0
+    file_formats = ['csv'] + (['parquet'] if ParquetEnergyData is not None else [])
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in file_formats:
+            data_storage.set_storage_format(file_format)
+            for backend, (open_backend, content) in backends(directory).items():
+                failures += check_steps(directory, backend, open_backend, content, file_format)
+        data_storage.set_storage_format('csv')
+        failures += check_midnight_chunks(directory)
+
+    if failures:
+        print(f"{failures} ingestion checks failed.")
+        sys.exit(1)
+    print("Incremental ingestion equals a load from scratch in all checks.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of the ProcessedData alignment step.
+Compares the former deepcopy + four chained left merges with the single-pass select_sources/align_sources
+on synthetic hourly raw data. Peak memory is the tracemalloc peak of the step (NumPy buffers included).
+
+Run from the repository root:
+    python -m benchmarks.merge_benchmark
+"""
+import copy
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.data_processing import align_sources, select_sources
+
+YEARS = (1, 10, 30)
+STATIONS = ['Praha', 'Plzen', 'Liberec', 'Ceske_Budejovice']
+
+
+def synthetic_raw_data(years) -> dict:
+    """
+    Builds raw data shaped like RawData.get_raw_data() covering 'years' of hourly data.
+    """
+    index = pd.DatetimeIndex(pd.date_range('2000-01-01', periods=years * 365 * 24, freq='h'), name='datetime')
+    rng = np.random.default_rng(0)
+
+    def stations(mean, std):
+        data = pd.DataFrame(rng.normal(mean, std, (len(index), len(STATIONS))), index=index, columns=STATIONS)
+        data['average'] = data.mean(axis=1)
+        return data
+
+    calendar = pd.DataFrame({'day_of_week': index.dayofweek}, index=index)
+    calendar['is_weekend'] = calendar['day_of_week'] >= 5
+    calendar['is_holiday'] = False
+
+    return {
+        'consumption': pd.DataFrame({'Values': rng.normal(7000, 1000, len(index))}, index=index),
+        'temperature': stations(10, 8),
+        'calendar': calendar,
+        'solar': stations(20, 20),
+        'wind': stations(12, 5)
+    }
+
+
+def legacy_merge(raw_data) -> pd.DataFrame:
+    """
+    The former ProcessedData.pick_raw_data, rename_average_columns and merge_raw_data.
+    """
+    data = copy.deepcopy(raw_data)
+    data = {
+        'consumption': data['consumption'],
+        'temperature': data['temperature'][['average']],
+        'calendar': data['calendar'],
+        'solar': data['solar'][['average']],
+        'wind': data['wind'][['average']]
+    }
+    data['consumption'].rename(columns={'Values': 'consumption'}, inplace=True)
+    data['temperature'].rename(columns={'average': 'temperature_average'}, inplace=True)
+    data['solar'].rename(columns={'average': 'solar_average'}, inplace=True)
+    data['wind'].rename(columns={'average': 'wind_average'}, inplace=True)
+    for key in data:
+        data[key].index = pd.to_datetime(data[key].index)
+
+    merged_data = data['consumption'].merge(data['temperature'], left_index=True, right_index=True, how="left")
+    merged_data = merged_data.merge(data['solar'], left_index=True, right_index=True, how="left")
+    merged_data = merged_data.merge(data['wind'], left_index=True, right_index=True, how="left")
+    merged_data = merged_data.merge(data['calendar'], left_index=True, right_index=True, how="left")
+
+    return merged_data
+
+
+def single_pass_merge(raw_data) -> pd.DataFrame:
+    return align_sources(select_sources(raw_data))
+
+
+def measure(merge, raw_data) -> tuple:
+    """
+    Returns (seconds, peak bytes, merged frame) of one merge run.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    merged = merge(raw_data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak, merged
+
+
+def main():
+    print(f"{'years':>5} {'rows':>8} {'merge':>12} {'time [s]':>9} {'peak [MB]':>10}")
+    for years in YEARS:
+        raw_data = synthetic_raw_data(years)
+        results = {}
+        for name, merge in (('legacy', legacy_merge), ('single-pass', single_pass_merge)):
+            elapsed, peak, results[name] = measure(merge, raw_data)
+            print(f"{years:>5} {len(raw_data['consumption']):>8} {name:>12} {elapsed:>9.3f} {peak / 1024 ** 2:>10.1f}")
+        pd.testing.assert_frame_equal(results['legacy'], results['single-pass'])
+
+
+if __name__ == '__main__':
+    main()
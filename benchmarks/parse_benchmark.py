@@ -0,0 +1,96 @@
+"""
+Benchmark of the raw data CSV parsers.
+Compares the legacy inferring parser (parse_dates + dayfirst) with the typed loader of RawData
+(explicit timestamp formats and dtypes) using the 'c' and the 'pyarrow' engine on synthetic hourly data.
+Both typed runs parse the non-ISO consumption timestamps with the Arrow strptime when pyarrow is installed.
+Every measurement runs in a fresh process, so the peak memory (max RSS) is not shared between runs.
+
+Run from the repository root:
+    python -m benchmarks.parse_benchmark
+"""
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+YEARS = (1, 10, 50)
+PARSERS = ('legacy', 'typed-c', 'typed-pyarrow')
+
+
+def write_synthetic_sources(directory, years) -> dict:
+    """
+    Writes a consumption file (dd.mm.YYYY H:MM timestamps) and a temperature file (ISO timestamps
+    with four stations and their average) covering 'years' of hourly data.
+    """
+    index = pd.date_range('2000-01-01', periods=years * 365 * 24, freq='h')
+    rng = np.random.default_rng(0)
+
+    consumption_path = os.path.join(directory, f'consumption_{years}y.csv')
+    consumption = pd.DataFrame({'Date': index.strftime('%d.%m.%Y ') + index.hour.astype(str) + ':00',
+                                'Values': rng.normal(7000, 1000, len(index))})
+    consumption.to_csv(consumption_path, sep=';', index=False)
+
+    temperature_path = os.path.join(directory, f'temperature_{years}y.csv')
+    temperature = pd.DataFrame(rng.normal(10, 8, (len(index), 4)).round(1),
+                               index=pd.Index(index, name='time'),
+                               columns=['Praha', 'Plzen', 'Liberec', 'Ceske_Budejovice'])
+    temperature['average'] = temperature.mean(axis=1)
+    temperature.to_csv(temperature_path, sep=';')
+
+    return {'consumption': consumption_path, 'temperature': temperature_path}
+
+
+def _parse(parser, paths, queue) -> None:
+    from src.data_loader import SOURCES, read_source_csv
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for name, path in paths.items():
+        if parser == 'legacy':
+            time_column = SOURCES[name]['time_column']
+            data = pd.read_csv(path, sep=';', parse_dates=[time_column], dayfirst=True)
+            data = data.set_index(time_column)
+            # dayfirst inference may leave ISO timestamps as text, ProcessedData converted them afterwards
+            data.index = pd.to_datetime(data.index)
+        else:
+            data = read_source_csv(path, SOURCES[name], engine=parser.split('-')[1])
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss
+
+    queue.put((elapsed, peak_rss * 1024))
+
+
+def measure(parser, paths) -> tuple:
+    """
+    Parses the files in a fresh process and returns (seconds, peak memory increase in bytes).
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_parse, args=(parser, paths, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def main():
+    print(f"{'years':>5} {'rows':>9} {'parser':>14} {'time [s]':>9} {'peak [MB]':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for years in YEARS:
+            paths = write_synthetic_sources(directory, years)
+            for parser in PARSERS:
+                try:
+                    elapsed, peak = measure(parser, paths)
+                except ImportError as e:
+                    print(f"{years:>5} {parser:>24} skipped: {e}")
+                    continue
+                print(f"{years:>5} {years * 365 * 24:>9} {parser:>14} {elapsed:>9.3f} {peak / 1024 ** 2:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
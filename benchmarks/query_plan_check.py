@@ -0,0 +1,67 @@
+"""
+Checks the EXPLAIN QUERY PLAN of the EnergyDataDB query methods.
+Every method is called with each combination of its year/month/day filters on a small synthetic database,
+the executed statements are recorded and their plans are checked: filtered aggregations have to search
+an index or the primary key of their rollup table and no query may sort its groups in a temporary B-tree.
+Exits with status 1 on a failed check.
+
+Run from the repository root:
+    python -m benchmarks.query_plan_check
+"""
+import inspect
+import os
+import sys
+import tempfile
+
+from benchmarks.db_load_benchmark import synthetic_processed_data
+from src.data_storage import storage_path, write_frame
+from src.db_loader import EnergyDataDB
+
+FILTERS = {'year': 1900, 'month': 2, 'day': 3}
+
+
+def filter_combinations(method) -> list:
+    """
+    Returns the keyword arguments of every filter combination a query method supports
+    (no filter, year, year + month, year + month + day).
+    """
+    names = [name for name in FILTERS if name in inspect.signature(method).parameters]
+    return [{name: FILTERS[name] for name in names[:count]} for count in range(len(names) + 1)]
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = storage_path(os.path.join(directory, 'merged_data.csv'))
+        write_frame(synthetic_processed_data(24 * 365), csv_path)
+        database = EnergyDataDB(db_path=os.path.join(directory, 'database.db'), csv_path=csv_path)
+
+        statements = []
+        for name, method in inspect.getmembers(database, inspect.ismethod):
+            if not name.startswith('get_'):
+                continue
+            for kwargs in filter_combinations(method):
+                database.pool.reader().set_trace_callback(statements.append)
+                method(**kwargs)
+                database.pool.reader().set_trace_callback(None)
+                for sql in statements:
+                    plan = database.query_plan(sql)
+                    problems = []
+                    if kwargs and not any(step.startswith('SEARCH') and ('INDEX' in step or 'PRIMARY KEY' in step) for step in plan):
+                        problems.append('no index search')
+                    if any('TEMP B-TREE' in step for step in plan):
+                        problems.append('temporary B-tree')
+                    status = 'FAIL ' + ', '.join(problems) if problems else 'ok'
+                    failures += bool(problems)
+                    print(f"{status:<8} {name}({', '.join(kwargs)}): {' | '.join(plan)}")
+                statements.clear()
+        database.close()
+
+    if failures:
+        print(f"{failures} query plans failed the check.")
+        sys.exit(1)
+    print("All query plans use an index.")
+
+
+if __name__ == '__main__':
+    main()
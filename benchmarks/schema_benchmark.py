@@ -0,0 +1,39 @@
+"""
+Benchmark of the memory footprint of the merged data.
+Compares the dtypes of the baseline merged data (float64 measurements, int64 day of week, bool flags)
+with the compact MERGED_SCHEMA (float32 measurements, int8 calendar fields, bool flags) on synthetic hourly
+raw data. The compact data includes the is_filled flag of the repair stage (see fill_gaps) like the stored
+merged data. Both keep the int64 DatetimeIndex, which is 8 of the 28 bytes per row left by the compact schema,
+so the footprint drops by about 44 %, not by more than half.
+
+Run from the repository root:
+    python -m benchmarks.schema_benchmark
+"""
+from benchmarks.merge_benchmark import synthetic_raw_data
+from src.data_processing import align_sources, fill_gaps, select_sources
+from src.data_schema import apply_schema, memory_report
+
+YEARS = (1, 10, 30)
+FORMER_DTYPES = {  # Dtypes of the merged data before the compact schema
+    'consumption': 'float64', 'temperature_average': 'float64', 'solar_average': 'float64', 'wind_average': 'float64',
+    'day_of_week': 'int64', 'is_weekend': 'bool', 'is_holiday': 'bool'
+    }
+
+
+def main():
+    for years in YEARS:
+        merged = align_sources(select_sources(synthetic_raw_data(years)))
+        wide = merged.astype(FORMER_DTYPES)
+        compact = apply_schema(fill_gaps(merged))
+        wide_report, compact_report = memory_report(wide), memory_report(compact)
+
+        print(f"\n{years} years, {len(wide)} rows")
+        print(wide_report.reindex(compact_report.index).join(compact_report, lsuffix='_wide', rsuffix='_compact').to_string())
+        ratio = compact_report.loc['total', 'bytes'] / wide_report.loc['total', 'bytes']
+        print(f"Compact schema: {ratio:.0%} of the former footprint, {1 - ratio:.0%} saved "
+              f"({wide_report.loc['total', 'bytes_per_year'] / 1024 ** 2:.2f} -> "
+              f"{compact_report.loc['total', 'bytes_per_year'] / 1024 ** 2:.2f} MB per year)")
+
+
+if __name__ == '__main__':
+    main()
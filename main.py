@@ -1,9 +1,12 @@
 
+import argparse
+
+from src import data_storage
 from src.data_loader import RawData
 from src.data_processing import ProcessedData
 from src.db_loader import EnergyDataDB
 from src.data_prediction import EnergyPredictor, predicted_last_week_data
-from src.data_analyze import show_month_data, show_day_data, show_hourly_winter_data, show_hourly_summer_data, show_hourly_winter_workday_data, show_hourly_summer_workday_data
+from src.data_analyze import AnalysisContext, show_month_data, show_day_data, show_hourly_winter_data, show_hourly_summer_data, show_hourly_winter_workday_data, show_hourly_summer_workday_data
 import pandas as pd
 import matplotlib.pyplot as plt
 
@@ -32,18 +35,22 @@ def process_data(raw_data):
 
 def analyze_data():
     """
-    Analyzes the processed data and returns the analysis results.
+    Analyzes the processed data, then closes the database (its WAL is checkpointed into the database file).
     """
     print("Analyzing processed data...")
     database = EnergyDataDB()
+    try:
+        context = AnalysisContext(database)
 
-    show_month_data(database)
-    show_day_data(database)
-    show_hourly_summer_data(database)
-    show_hourly_winter_data(database)
-    show_hourly_winter_workday_data(database)
-    show_hourly_summer_workday_data(database)
-    return database
+        show_month_data(context)
+        show_day_data(context)
+        show_hourly_summer_data(context)
+        show_hourly_winter_data(context)
+        show_hourly_winter_workday_data(context)
+        show_hourly_summer_workday_data(context)
+        print(f"Query cache: {database.cache_stats()}")
+    finally:
+        database.close()
 
 
 
@@ -61,6 +68,16 @@ def predicted_data():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Collects, processes and analyzes the energy consumption data.")
+    parser.add_argument('--storage-format', choices=list(data_storage.STORAGE_FORMATS), default=data_storage.STORAGE_FORMAT,
+                        help="Storage format of data/external and data/processed (default: %(default)s).")
+    parser.add_argument('--export-csv', action='store_true', help="Also export a ';' separated CSV next to columnar files.")
+    args = parser.parse_args()
+
+    data_storage.set_storage_format(args.storage_format, export_csv=args.export_csv)
+    for path in data_storage.convert_csv_files():
+        print(f"Converted {data_storage.storage_path(path, 'csv')} to {path}.")
+
     raw_data = collect_data()
     process_data(raw_data)
     analyze_data()
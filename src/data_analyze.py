@@ -1,26 +1,70 @@
 import os
-import datetime
-from collections import defaultdict
 import numpy as np
+import pandas as pd
 
 import matplotlib.pyplot as plt
 
-def show_month_data(database):
+
+class AnalysisContext:
     """
-    Plots total consumption and average temperature per month for all available years and saves the plot as a picture in the outputs folder.
+    Hourly consumption and temperature loaded from the database once and shared by the show_* plots,
+    which take their slices and aggregates from it instead of querying the database.
+    Attributes:
+        database: Query backend (EnergyDataDB or ParquetEnergyData).
+        hourly (pd.DataFrame): 'consumption' and 'temperature_average' (float64) per hour, indexed by the hour ('datetime').
+        iso_week (np.ndarray): ISO week number of every hour of 'hourly'.
+    Methods:
+        monthly() -> pd.DataFrame:
+            Total consumption and average temperature per month.
+        daily() -> pd.DataFrame:
+            Total consumption and average temperature per day.
+    """
+    def __init__(self, database):
+        self.database = database
+        self.hourly = database.aggregate(['consumption', 'temperature_average'], 'hourly',
+                                         agg={'consumption': 'sum', 'temperature_average': 'avg'})
+        self.iso_week = self.hourly.index.isocalendar().week.to_numpy()
+
+    def _per_period(self, periods) -> pd.DataFrame:
+        """
+        Sums the consumption and averages the temperature of the hours grouped by 'periods' (period starts),
+        periods without data are left out and sums of only missing values stay NaN, as in the database rollups.
+        """
+        groups = self.hourly.groupby(periods)
+        data = pd.DataFrame({
+            'consumption': groups['consumption'].sum(min_count=1),
+            'temperature_average': groups['temperature_average'].mean()
+        })
+        data.index.name = 'datetime'
+        return data
+
+    def monthly(self) -> pd.DataFrame:
+        return self._per_period(self.hourly.index.to_period('M').to_timestamp())
+
+    def daily(self) -> pd.DataFrame:
+        return self._per_period(self.hourly.index.floor('D'))
+
+
+def analysis_context(context) -> AnalysisContext:
+    """
+    Returns 'context' if it is an AnalysisContext, otherwise loads a database into a new one.
+    """
+    return context if isinstance(context, AnalysisContext) else AnalysisContext(context)
+
 
-    :param database: Database object with required query methods
+def show_month_data(context):
     """
+    Plots total consumption and average temperature per month for all available years and saves the plot as a picture in the outputs folder.
 
-    results = database.get_consumption_per_month()
-    results_temp = database.get_average_temperature_per_month()
+    :param context: AnalysisContext (or a database, loaded into a new one)
+    """
 
-    # Use datetime objects for direct timeline on x-axis
-    months = [datetime.datetime(row[0], row[1], 1) for row in results]
-    consumption = [row[2] for row in results]
+    data = analysis_context(context).monthly()
 
-    temp_months = [datetime.datetime(row[0], row[1], 1) for row in results_temp]
-    avg_temp = [row[2] for row in results_temp]
+    # The datetime index gives a direct timeline on the x-axis
+    months = temp_months = data.index
+    consumption = data['consumption']
+    avg_temp = data['temperature_average']
 
     plt.figure(figsize=(14, 6))
     ax1 = plt.gca()
@@ -60,50 +104,34 @@ def show_month_data(database):
     #plt.show()
 
 
-def show_day_data(database):
+def show_day_data(context):
     """
     Plots total consumption and average temperature per day for all available years, 
     and also shows the average per-day values for each day-of-year across all years.
     Saves the plot as a picture in the outputs folder.
 
-    :param database: Database object with required query methods
+    :param context: AnalysisContext (or a database, loaded into a new one)
     """
 
-    results = database.get_consumption_per_day()
-    results_temp = database.get_average_temperature_per_day()
-
-    # Use datetime objects for direct timeline on x-axis
-    days = [datetime.datetime(row[0], row[1], row[2]) for row in results]
-    consumption = [row[3] for row in results]
+    data = analysis_context(context).daily()
 
-    temp_days = [datetime.datetime(row[0], row[1], row[2]) for row in results_temp]
-    avg_temp = [row[3] for row in results_temp]
+    # The datetime index gives a direct timeline on the x-axis
+    days = temp_days = data.index
+    consumption = data['consumption']
+    avg_temp = data['temperature_average']
 
     # Calculate average per day-of-year across all years
+    day_of_year_average = data.groupby(days.dayofyear).mean()
 
-    doy_consumption = defaultdict(list)
-    doy_temp = defaultdict(list)
-
-    for dt, cons in zip(days, consumption):
-        doy = dt.timetuple().tm_yday
-        doy_consumption[doy].append(cons)
-
-    for dt, temp in zip(temp_days, avg_temp):
-        doy = dt.timetuple().tm_yday
-        doy_temp[doy].append(temp)
-
-    # Build average series for plotting
+    # Use the first year in the data for x-axis reference
     avg_days = []
     avg_consumption = []
     avg_temperature = []
-
-    # Use the first year in the data for x-axis reference
-    if days:
-        ref_year = min(dt.year for dt in days)
-        for doy in sorted(doy_consumption.keys()):
-            avg_days.append(datetime.datetime(ref_year, 1, 1) + datetime.timedelta(days=doy-1))
-            avg_consumption.append(np.mean(doy_consumption[doy]))
-            avg_temperature.append(np.mean(doy_temp[doy]))
+    if len(days):
+        ref_year = days.year.min()
+        avg_days = pd.Timestamp(ref_year, 1, 1) + pd.to_timedelta(day_of_year_average.index - 1, unit='D')
+        avg_consumption = day_of_year_average['consumption']
+        avg_temperature = day_of_year_average['temperature_average']
 
     plt.figure(figsize=(16, 6))
     ax1 = plt.gca()
@@ -151,64 +179,38 @@ def show_day_data(database):
     #plt.show()
 
 
-def show_hourly_winter_data(database):
+def show_hourly_winter_data(context):
     """
     Plots total consumption and average temperature per hour for the 3rd week of the year 2023,
     and also shows the average per-hour values for all 3rd weeks across all years.
     Saves the plot as a picture in the outputs folder.
 
-    :param database: Database object with required query methods
+    :param context: AnalysisContext (or a database, loaded into a new one)
     """
 
-    results = database.get_consumption_per_hour()
-    results_temp = database.get_average_temperature_per_hour()
-
-    # Use datetime objects for direct timeline on x-axis
-    hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results]
-    consumption = [row[4] for row in results]
-
-    temp_hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results_temp]
-    avg_temp = [row[4] for row in results_temp]
+    context = analysis_context(context)
+    hourly = context.hourly
 
     # Filter for only the 3rd week of the year 2023 (ISO week 3)
-    filtered = [(dt, cons) for dt, cons in zip(hours, consumption) if dt.isocalendar()[1] == 3 and dt.year == 2023]
-    filtered_temp = [(dt, temp) for dt, temp in zip(temp_hours, avg_temp) if dt.isocalendar()[1] == 3 and dt.year == 2023]
+    week = hourly[(hourly.index.year == 2023) & (context.iso_week == 3)]
 
-    if not filtered or not filtered_temp:
+    if week.empty:
         print("No data for the 3rd week of the year 2023.")
         return
 
-    hours_2023, consumption_2023 = zip(*filtered)
-    temp_hours_2023, avg_temp_2023 = zip(*filtered_temp)
+    hours_2023 = temp_hours_2023 = week.index
+    consumption_2023 = week['consumption']
+    avg_temp_2023 = week['temperature_average']
 
     # Calculate average per-hour values for all 3rd weeks across all years
-    hour_of_week_consumption = defaultdict(list)
-    hour_of_week_temp = defaultdict(list)
-
-    for dt, cons in zip(hours, consumption):
-        if dt.isocalendar()[1] == 3:
-            hour_of_week = (dt.weekday(), dt.hour)
-            hour_of_week_consumption[hour_of_week].append(cons)
-
-    for dt, temp in zip(temp_hours, avg_temp):
-        if dt.isocalendar()[1] == 3:
-            hour_of_week = (dt.weekday(), dt.hour)
-            hour_of_week_temp[hour_of_week].append(temp)
-
-    # Prepare average series for plotting
-    # Build a timeline for the 3rd week of 2023
-    week_start = min(hours_2023)
-    avg_consumption_series = []
-    avg_temp_series = []
-    avg_time_series = []
-
-    for dt in hours_2023:
-        hour_of_week = (dt.weekday(), dt.hour)
-        avg_c = np.mean(hour_of_week_consumption[hour_of_week]) if hour_of_week in hour_of_week_consumption else np.nan
-        avg_t = np.mean(hour_of_week_temp[hour_of_week]) if hour_of_week in hour_of_week_temp else np.nan
-        avg_consumption_series.append(avg_c)
-        avg_temp_series.append(avg_t)
-        avg_time_series.append(dt)
+    weeks = hourly[context.iso_week == 3]
+    hour_of_week_average = weeks.groupby([weeks.index.dayofweek, weeks.index.hour]).mean()
+
+    # Average series on the timeline of the 3rd week of 2023
+    average = hour_of_week_average.reindex(pd.MultiIndex.from_arrays([week.index.dayofweek, week.index.hour]))
+    avg_time_series = week.index
+    avg_consumption_series = average['consumption'].to_numpy()
+    avg_temp_series = average['temperature_average'].to_numpy()
 
     plt.figure(figsize=(18, 6))
     ax1 = plt.gca()
@@ -258,34 +260,27 @@ def show_hourly_winter_data(database):
     #plt.show()
 
 
-def show_hourly_summer_data(database):
+def show_hourly_summer_data(context):
     """
     Plots total consumption and average temperature per hour for the 28th week of the year 2023.
     Saves the plot as a picture in the outputs folder.
 
-    :param database: Database object with required query methods
+    :param context: AnalysisContext (or a database, loaded into a new one)
     """
 
-    results = database.get_consumption_per_hour()
-    results_temp = database.get_average_temperature_per_hour()
-
-    # Use datetime objects for direct timeline on x-axis
-    hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results]
-    consumption = [row[4] for row in results]
-
-    temp_hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results_temp]
-    avg_temp = [row[4] for row in results_temp]
+    context = analysis_context(context)
+    hourly = context.hourly
 
     # Filter for only the 28th week of the year 2023 (ISO week 28)
-    filtered = [(dt, cons) for dt, cons in zip(hours, consumption) if dt.isocalendar()[1] == 28 and dt.year == 2023]
-    filtered_temp = [(dt, temp) for dt, temp in zip(temp_hours, avg_temp) if dt.isocalendar()[1] == 28 and dt.year == 2023]
+    week = hourly[(hourly.index.year == 2023) & (context.iso_week == 28)]
 
-    if not filtered or not filtered_temp:
+    if week.empty:
         print("No data for the 28th week of the year 2023.")
         return
 
-    hours_2023, consumption_2023 = zip(*filtered)
-    temp_hours_2023, avg_temp_2023 = zip(*filtered_temp)
+    hours_2023 = temp_hours_2023 = week.index
+    consumption_2023 = week['consumption']
+    avg_temp_2023 = week['temperature_average']
 
     plt.figure(figsize=(18, 6))
     ax1 = plt.gca()
@@ -330,66 +325,38 @@ def show_hourly_summer_data(database):
     #plt.show()
 
 
-def show_hourly_winter_workday_data(database):
+def show_hourly_winter_workday_data(context):
     """
     Plots total consumption and average temperature per hour for a single winter workday (Monday) in January 2023,
     and also shows the average per-hour values for all Mondays in January across all years.
     Saves the plot as a picture in the outputs folder.
 
-    :param database: Database object with required query methods
+    :param context: AnalysisContext (or a database, loaded into a new one)
     """
 
-    results = database.get_consumption_per_hour()
-    results_temp = database.get_average_temperature_per_hour()
-
-    # Use datetime objects for direct timeline on x-axis
-    hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results]
-    consumption = [row[4] for row in results]
-
-    temp_hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results_temp]
-    avg_temp = [row[4] for row in results_temp]
+    context = analysis_context(context)
+    hourly = context.hourly
+    mondays = hourly[(hourly.index.month == 1) & (hourly.index.dayofweek == 0)]
 
     # Filter for only the first Monday in January 2023
-    filtered = [(dt, cons) for dt, cons in zip(hours, consumption)
-                if dt.year == 2023 and dt.month == 1 and dt.weekday() == 0]
-    filtered_temp = [(dt, temp) for dt, temp in zip(temp_hours, avg_temp)
-                     if dt.year == 2023 and dt.month == 1 and dt.weekday() == 0]
+    filtered = mondays[mondays.index.year == 2023]
 
-    if not filtered or not filtered_temp:
+    if filtered.empty:
         print("No data for a winter workday (Monday) in January 2023.")
         return
 
     # Pick the first Monday (or you can change to another if needed)
-    first_monday = min(dt for dt, _ in filtered)
-    hours_2023 = [dt for dt, _ in filtered if dt.date() == first_monday.date()]
-    consumption_2023 = [cons for dt, cons in filtered if dt.date() == first_monday.date()]
-    temp_hours_2023 = [dt for dt, _ in filtered_temp if dt.date() == first_monday.date()]
-    avg_temp_2023 = [temp for dt, temp in filtered_temp if dt.date() == first_monday.date()]
+    first_monday = filtered.index.min().normalize()
+    day = filtered[filtered.index.normalize() == first_monday]
+    hours_2023 = temp_hours_2023 = day.index
+    consumption_2023 = day['consumption']
+    avg_temp_2023 = day['temperature_average']
 
     # Calculate average per-hour values for all Mondays in January across all years
-    hour_of_day_consumption = defaultdict(list)
-    hour_of_day_temp = defaultdict(list)
-
-    for dt, cons in zip(hours, consumption):
-        if dt.month == 1 and dt.weekday() == 0:
-            hour_of_day_consumption[dt.hour].append(cons)
-
-    for dt, temp in zip(temp_hours, avg_temp):
-        if dt.month == 1 and dt.weekday() == 0:
-            hour_of_day_temp[dt.hour].append(temp)
-
-    # Prepare average series for plotting
-    avg_consumption_series = []
-    avg_temp_series = []
-    avg_time_series = []
-
-    for dt in hours_2023:
-        hour = dt.hour
-        avg_c = np.mean(hour_of_day_consumption[hour]) if hour in hour_of_day_consumption else np.nan
-        avg_t = np.mean(hour_of_day_temp[hour]) if hour in hour_of_day_temp else np.nan
-        avg_consumption_series.append(avg_c)
-        avg_temp_series.append(avg_t)
-        avg_time_series.append(dt)
+    average = mondays.groupby(mondays.index.hour).mean().reindex(day.index.hour)
+    avg_time_series = day.index
+    avg_consumption_series = average['consumption'].to_numpy()
+    avg_temp_series = average['temperature_average'].to_numpy()
 
     plt.figure(figsize=(14, 6))
     ax1 = plt.gca()
@@ -438,66 +405,38 @@ def show_hourly_winter_workday_data(database):
 
     #plt.show()
 
-def show_hourly_summer_workday_data(database):
+def show_hourly_summer_workday_data(context):
     """
     Plots total consumption and average temperature per hour for a single workday (Monday) in June 2023,
     and also shows the average per-hour values for all Mondays in June across all years.
     Saves the plot as a picture in the outputs folder.
 
-    :param database: Database object with required query methods
+    :param context: AnalysisContext (or a database, loaded into a new one)
     """
 
-    results = database.get_consumption_per_hour()
-    results_temp = database.get_average_temperature_per_hour()
-
-    # Use datetime objects for direct timeline on x-axis
-    hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results]
-    consumption = [row[4] for row in results]
-
-    temp_hours = [datetime.datetime(row[0], row[1], row[2], row[3]) for row in results_temp]
-    avg_temp = [row[4] for row in results_temp]
+    context = analysis_context(context)
+    hourly = context.hourly
+    mondays = hourly[(hourly.index.month == 6) & (hourly.index.dayofweek == 0)]
 
     # Filter for only the Mondays in June 2023
-    filtered = [(dt, cons) for dt, cons in zip(hours, consumption)
-                if dt.year == 2023 and dt.month == 6 and dt.weekday() == 0]
-    filtered_temp = [(dt, temp) for dt, temp in zip(temp_hours, avg_temp)
-                        if dt.year == 2023 and dt.month == 6 and dt.weekday() == 0]
+    filtered = mondays[mondays.index.year == 2023]
 
-    if not filtered or not filtered_temp:
+    if filtered.empty:
         print("No data for a summer workday (Monday) in June 2023.")
         return
 
     # Pick the first Monday (or you can change to another if needed)
-    first_monday = min(dt for dt, _ in filtered)
-    hours_2023 = [dt for dt, _ in filtered if dt.date() == first_monday.date()]
-    consumption_2023 = [cons for dt, cons in filtered if dt.date() == first_monday.date()]
-    temp_hours_2023 = [dt for dt, _ in filtered_temp if dt.date() == first_monday.date()]
-    avg_temp_2023 = [temp for dt, temp in filtered_temp if dt.date() == first_monday.date()]
+    first_monday = filtered.index.min().normalize()
+    day = filtered[filtered.index.normalize() == first_monday]
+    hours_2023 = temp_hours_2023 = day.index
+    consumption_2023 = day['consumption']
+    avg_temp_2023 = day['temperature_average']
 
     # Calculate average per-hour values for all Mondays in June across all years
-    hour_of_day_consumption = defaultdict(list)
-    hour_of_day_temp = defaultdict(list)
-
-    for dt, cons in zip(hours, consumption):
-        if dt.month == 6 and dt.weekday() == 0:
-            hour_of_day_consumption[dt.hour].append(cons)
-
-    for dt, temp in zip(temp_hours, avg_temp):
-        if dt.month == 6 and dt.weekday() == 0:
-            hour_of_day_temp[dt.hour].append(temp)
-
-    # Prepare average series for plotting
-    avg_consumption_series = []
-    avg_temp_series = []
-    avg_time_series = []
-
-    for dt in hours_2023:
-        hour = dt.hour
-        avg_c = np.mean(hour_of_day_consumption[hour]) if hour in hour_of_day_consumption else np.nan
-        avg_t = np.mean(hour_of_day_temp[hour]) if hour in hour_of_day_temp else np.nan
-        avg_consumption_series.append(avg_c)
-        avg_temp_series.append(avg_t)
-        avg_time_series.append(dt)
+    average = mondays.groupby(mondays.index.hour).mean().reindex(day.index.hour)
+    avg_time_series = day.index
+    avg_consumption_series = average['consumption'].to_numpy()
+    avg_temp_series = average['temperature_average'].to_numpy()
 
     plt.figure(figsize=(14, 6))
     ax1 = plt.gca()
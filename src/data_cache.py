@@ -0,0 +1,332 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from src.data_storage import read_frame, write_frame
+
+
+class StationCache:
+    """
+    Persistent on-disk cache for meteostat station responses.
+    Every response is stored as a pickled DataFrame named by a hash of the station coordinates,
+    the variable set and the time range.
+    Attributes:
+        directory (str): Directory where the cached responses are stored.
+        ttl (timedelta): Time to live of responses covering a month which is not closed yet,
+                         because recent data can still be revised by meteostat.
+        max_size (int): Size cap of the cache directory in bytes, least recently used entries are evicted first.
+        hits (int): Number of responses served from the cache.
+        misses (int): Number of responses which had to be fetched.
+        expired (int): Number of cached responses dropped because their TTL was exceeded.
+        evictions (int): Number of cached responses evicted by the size cap.
+    Methods:
+        make_key(geo, variables, timestart, timeend) -> str:
+            Builds the cache key of one station request.
+        get(key, timeend) -> pd.DataFrame:
+            Returns the cached response or None on a miss.
+        put(key, data):
+            Stores a response and evicts least recently used entries above the size cap.
+        stats() -> dict:
+            Returns the hit/miss counters and the current cache size.
+    """
+    def __init__(self, directory='data/cache/meteostat', ttl=timedelta(hours=12), max_size=512 * 1024 ** 2):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(geo, variables, timestart, timeend) -> str:
+        coordinates = (getattr(geo, '_lat', None), getattr(geo, '_lon', None), getattr(geo, '_alt', None))
+        variable_set = ','.join(sorted(variables)) if variables else 'all'
+        raw_key = f"{coordinates}|{variable_set}|{pd.Timestamp(timestart).isoformat()}|{pd.Timestamp(timeend).isoformat()}"
+        return hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _month_closed_at(timeend) -> datetime:
+        """
+        Returns the moment when the month of 'timeend' is closed, i.e. the first day of the following month.
+        """
+        timeend = pd.Timestamp(timeend)
+        return (timeend.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + pd.DateOffset(months=1)).to_pydatetime()
+
+    def _path(self, key) -> str:
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def get(self, key, timeend) -> pd.DataFrame:
+        """
+        Returns the cached response for 'key' or None on a miss.
+        Responses written after their month was closed are kept permanently,
+        the others expire after the TTL.
+        """
+        path = self._path(key)
+        try:
+            stored_at = datetime.fromtimestamp(os.path.getmtime(path))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if stored_at < self._month_closed_at(timeend) and datetime.now() - stored_at > self.ttl:
+            os.remove(path)
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
+            return None
+
+        data = pd.read_pickle(path)
+        # The access time is used for LRU eviction, the modification time keeps the write time for the TTL
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        with self._lock:
+            self.hits += 1
+
+        return data
+
+    def put(self, key, data) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        data.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Removes least recently used entries until the cache directory fits into max_size.
+        """
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total_size -= size
+                self.evictions += 1
+
+    def size(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.pkl'))
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'size': self.size()
+        }
+
+
+class CachedBackend:
+    """
+    Fetch backend wrapper which serves station responses from a StationCache
+    and fetches only the missing ones from the wrapped backend.
+    Attributes:
+        backend: Wrapped fetch backend (e.g. MeteostatBackend).
+        cache (StationCache): Persistent response cache.
+        variables (list): Meteostat columns kept in the cached responses, None keeps all of them.
+    """
+    def __init__(self, backend, cache=None, variables=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else StationCache()
+        self.variables = variables
+
+    def fetch(self, city, geo, timestart, timeend) -> pd.DataFrame:
+        key = self.cache.make_key(geo, self.variables, timestart, timeend)
+        data = self.cache.get(key, timeend)
+        if data is None:
+            data = self.backend.fetch(city, geo, timestart, timeend)
+            if self.variables:
+                data = data[list(self.variables)]
+            if not data.empty:
+                self.cache.put(key, data)
+
+        return data
+
+
+class ParsedFrameCache:
+    """
+    Binary cache of parsed raw input frames, stored next to their source file as an uncompressed
+    Arrow IPC file ('<file>.parsed.feather') which is memory-mapped on load.
+    The cache is keyed by the source file size, modification time and content hash, plus a key of the
+    parser settings. The content is hashed only if size or modification time changed, so touching a file
+    without changing it does not trigger a rebuild.
+    Attributes:
+        hits (int): Number of frames loaded from the cache.
+        misses (int): Number of frames parsed from their source.
+    Methods:
+        load(path, key, parse) -> pd.DataFrame:
+            Returns the cached frame of 'path', or parses it with 'parse' and caches the result.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_paths(path) -> tuple:
+        return f'{path}.parsed.feather', f'{path}.parsed.json'
+
+    @staticmethod
+    def content_hash(path) -> str:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _read_fingerprint(self, fingerprint_path) -> dict:
+        try:
+            with open(fingerprint_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _is_valid(self, path, key, fingerprint, fingerprint_path) -> bool:
+        if fingerprint is None or fingerprint.get('key') != key:
+            return False
+        stat = os.stat(path)
+        if fingerprint['size'] != stat.st_size:
+            return False
+        if fingerprint['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if fingerprint['sha1'] != self.content_hash(path):
+            return False
+
+        # Same content with a new modification time, remember it to skip hashing next time
+        fingerprint['mtime_ns'] = stat.st_mtime_ns
+        with open(fingerprint_path, 'w', encoding='utf-8') as f:
+            json.dump(fingerprint, f)
+        return True
+
+    def load(self, path, key, parse) -> pd.DataFrame:
+        """
+        Returns the parsed frame of 'path'.
+        Args:
+            path (str): Source file.
+            key (str): Parser settings, a different key invalidates the cached frame.
+            parse: Callable returning the parsed frame, called only on a cache miss.
+        """
+        frame_path, fingerprint_path = self.cache_paths(path)
+        fingerprint = self._read_fingerprint(fingerprint_path)
+        if os.path.exists(frame_path) and self._is_valid(path, key, fingerprint, fingerprint_path):
+            self.hits += 1
+            return read_frame(frame_path, memory_map=True)
+
+        self.misses += 1
+        stat = os.stat(path)
+        sha1 = self.content_hash(path)
+        data = parse()
+        write_frame(data, frame_path, export_csv=False)
+        with open(fingerprint_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1}, f)
+
+        return data
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class QueryResultCache:
+    """
+    Bounded in-memory LRU cache of database query results.
+    Entries are keyed by the query method and its parameters and belong to one data version,
+    a get with another version clears the cache, so results never outlive the data they were computed from.
+    Attributes:
+        max_entries (int): Number of results kept, the least recently used one is evicted first.
+        version: Data version of the cached results.
+        hits (int): Number of results served from the cache.
+        misses (int): Number of results which had to be queried.
+        evictions (int): Number of results evicted by the size cap.
+        invalidations (int): Number of times the cache was cleared by a new data version.
+    Methods:
+        make_key(method, *args, **kwargs) -> tuple:
+            Builds the hashable key of a query, lists, sets and dicts in the parameters included.
+        get(key, version):
+            Returns the cached result or None on a miss.
+        put(key, version, result):
+            Stores a result and evicts the least recently used one above max_entries.
+        stats() -> dict:
+            Returns the hit/miss counters and the current number of entries.
+    """
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def make_key(cls, method, *args, **kwargs) -> tuple:
+        return (method, cls._freeze(args), cls._freeze(sorted(kwargs.items())))
+
+    @classmethod
+    def _freeze(cls, value):
+        if isinstance(value, dict):
+            return ('dict', tuple((key, cls._freeze(item)) for key, item in sorted(value.items(), key=lambda item: str(item[0]))))
+        if isinstance(value, (set, frozenset)):
+            return ('set', tuple(sorted(cls._freeze(item) for item in value)))
+        if isinstance(value, (list, tuple)):
+            return tuple(cls._freeze(item) for item in value)
+        return value
+
+    def _check_version(self, version) -> None:
+        if version != self.version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self.version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, version, result) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries)
+        }
@@ -1,10 +1,15 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from meteostat import Point, Hourly
 from datetime import datetime
 import pandas as pd
 import holidays
 import numpy as np
 
+from src.data_cache import CachedBackend
+from src.data_storage import append_frame, read_last_index, storage_path, write_frame
+
 PLACES = {  # Dictionary of cities with their geographical coordinates for data collection
     'Praha': Point(50.0755, 14.4378),
     'Plzen': Point(49.7475, 13.3776),
@@ -15,6 +20,61 @@ PLACES = {  # Dictionary of cities with their geographical coordinates for data
 TIMESTART = datetime(2023, 1, 1, 0) # Start time for data collection
 TIMEEND = datetime(2024, 4, 22, 8)  # End time for data collection
 
+METEO_VARIABLES = {  # Meteostat hourly columns available from a single station fetch
+    'temperature': 'temp',
+    'dew_point': 'dwpt',
+    'humidity': 'rhum',
+    'precipitation': 'prcp',
+    'snow': 'snow',
+    'wind_direction': 'wdir',
+    'wind_speed': 'wspd',
+    'wind_gust': 'wpgt',
+    'pressure': 'pres',
+    'sunshine': 'tsun',
+    'condition': 'coco'
+    }
+
+class MeteostatBackend:
+    """
+    Fetch backend downloading hourly station data from the live meteostat service.
+    Methods:
+        fetch(city, geo, timestart, timeend) -> pd.DataFrame:
+            Returns the full hourly frame of one station.
+    """
+    def fetch(self, city, geo, timestart, timeend) -> pd.DataFrame:
+        return Hourly(geo, timestart, timeend).fetch()
+
+
+class LocalStationBackend:
+    """
+    Local on-disk stand-in for the meteostat service, used by tests and benchmarks.
+    Every station is stored as '<city>.csv' (';' separated, 'time' column) in one directory.
+    Attributes:
+        directory (str): Directory with the station files.
+        latency (float): Artificial delay in seconds added to every fetch to simulate a network round trip.
+    Methods:
+        fetch(city, geo, timestart, timeend) -> pd.DataFrame:
+            Reads the station file and returns the rows of the requested period.
+        store_station(city, data):
+            Writes a station frame (e.g. from a live fetch) into the stand-in directory.
+    """
+    def __init__(self, directory, latency=0.0):
+        self.directory = directory
+        self.latency = latency
+
+    def fetch(self, city, geo, timestart, timeend) -> pd.DataFrame:
+        if self.latency:
+            time.sleep(self.latency)
+        path = os.path.join(self.directory, f'{city}.csv')
+        data = pd.read_csv(path, sep=';', parse_dates=['time'], index_col='time')
+
+        return data.loc[timestart:timeend]
+
+    def store_station(self, city, data):
+        os.makedirs(self.directory, exist_ok=True)
+        data.to_csv(os.path.join(self.directory, f'{city}.csv'), sep=';', index_label='time')
+
+
 class DataCollector:
     """
     A parent class for collecting, processing, and storing various types of data.
@@ -23,32 +83,202 @@ class DataCollector:
         _timestart (datetime): The start time for data collection.
         _timeend (datetime): The end time for data collection.
         storage_path (str): The file path where the collected data will be stored.
+        incremental (bool): If True, only the hours after the last stored timestamp (watermark) are collected
+                            and appended to the existing file instead of rewriting it.
+        is_up_to_date (bool): True if the stored file already covers the whole collection period.
+        _station_frames (dict): Full hourly meteostat frames shared by all collectors, keyed by
+                                (city, timestart, timeend), so every station is fetched only once per run.
+                                Stations which could not be fetched are stored as None.
+        failed_stations (dict): City names of stations which failed after all retries mapped to the last error.
+        backend: Fetch backend with a fetch(city, geo, timestart, timeend) method
+                 (MeteostatBackend behind a persistent CachedBackend by default).
+        max_workers (int): Number of stations fetched in parallel, 1 means sequential collection.
+        retries (int): Number of attempts per station before it is reported as failed.
+        retry_delay (float): Base delay in seconds between attempts, multiplied by the attempt number.
     Methods:
         collect_data():
             Abstract method to be implemented by child classes for collecting specific types of data.
+        configure(backend=None, max_workers=None, retries=None, retry_delay=None):
+            Sets the fetch backend and concurrency options for all collectors.
+        prefetch_stations() -> dict:
+            Fetches all not yet shared stations (in parallel if max_workers > 1) and returns the failed ones.
+        fetch_station(city, geo) -> pd.DataFrame:
+            Returns the full hourly frame of one station, fetching it only if it is not shared yet.
+        collect_station_variable(variable) -> pd.DataFrame:
+            Builds a DataFrame of one meteo variable for all places plus their average.
+        clear_station_cache():
+            Drops all shared station frames, so the next access fetches fresh data.
+        data_path() -> str:
+            Returns the path of the data file in the configured storage format (see src.data_storage).
+        read_watermark() -> pd.Timestamp:
+            Returns the last timestamp stored in the data file, or None if there is no stored data.
+        store_data():
+            Saves the collected data in the configured storage format, or appends it in incremental mode.
         store_data_in_csv():
-            Saves the collected data to a CSV file.
+            Exports the collected data to a ';' separated CSV file.
         data_preview():
             Prints a preview of the collected data.
     """
-    def __init__(self, file_name):
+    _station_frames = {}
+    failed_stations = {}
+    backend = CachedBackend(MeteostatBackend())
+    max_workers = 1
+    retries = 3
+    retry_delay = 1.0
+
+    def __init__(self, file_name, incremental=False):
         self._places = PLACES
         self._timestart = TIMESTART
         self._timeend = TIMEEND
         self.storage_path = 'data/external/'
         self.file_name = file_name
+        self.incremental = incremental
         self._ensure_directory_exists()
 
+        self._watermark = self.read_watermark() if incremental else None
+        if self._watermark is not None:
+            self._timestart = max(self._timestart, self._watermark + pd.Timedelta(hours=1))
+        self.is_up_to_date = self._timestart > self._timeend
+        if self.is_up_to_date:
+            print(f"{self.data_path()} is up to date (last stored hour {self._watermark}).")
+
     def collect_data(self):
         raise NotImplementedError("Subclasses must implement the collect_data method.")
 
-    def store_data_in_csv(self):
+    @classmethod
+    def configure(cls, backend=None, max_workers=None, retries=None, retry_delay=None):
+        """
+        Sets the fetch backend and concurrency options shared by all collectors.
+        Options left as None keep their current value.
+        """
+        if backend is not None:
+            DataCollector.backend = backend
+        if max_workers is not None:
+            DataCollector.max_workers = max(1, int(max_workers))
+        if retries is not None:
+            DataCollector.retries = max(1, int(retries))
+        if retry_delay is not None:
+            DataCollector.retry_delay = retry_delay
+
+    def _station_key(self, city) -> tuple:
+        return (city, self._timestart, self._timeend)
+
+    def _fetch_with_retry(self, city, geo) -> tuple:
+        """
+        Fetches one station from the backend, retrying failed attempts.
+        Returns a (data, error) tuple, where exactly one of the items is None.
+        """
+        error = None
+        for attempt in range(1, self.retries + 1):
+            try:
+                return self.backend.fetch(city, geo, self._timestart, self._timeend), None
+            except Exception as e:
+                error = e
+                print(f"Warning: Fetching station {city} failed (attempt {attempt}/{self.retries}): {e}")
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * attempt)
+
+        return None, error
+
+    def prefetch_stations(self) -> dict:
+        """
+        Fetches all stations of the collection period which are not shared yet.
+        With max_workers > 1 the stations are fetched in parallel on a thread pool.
+        Returns:
+            dict: Failed stations mapped to the last error.
+        """
+        missing = {city: geo for city, geo in self._places.items()
+                   if self._station_key(city) not in DataCollector._station_frames}
 
-        # Save the data to CSV
-        if self.data is not None:
-            self.data.to_csv(os.path.join(self.storage_path, self.file_name), sep=';')
+        if self.max_workers > 1 and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = dict(zip(missing, executor.map(lambda item: self._fetch_with_retry(*item), missing.items())))
+        else:
+            results = {city: self._fetch_with_retry(city, geo) for city, geo in missing.items()}
+
+        for city, (data, error) in results.items():
+            DataCollector._station_frames[self._station_key(city)] = data
+            if error is not None:
+                DataCollector.failed_stations[city] = error
+                print(f"Warning: Station {city} failed after {self.retries} attempts and is skipped.")
+            else:
+                DataCollector.failed_stations.pop(city, None)
+
+        return dict(DataCollector.failed_stations)
+
+    def fetch_station(self, city, geo) -> pd.DataFrame:
+        """
+        Returns the full hourly frame (all meteo variables) of one station for the collection period,
+        or None if the station failed. The frame is fetched only once and then shared by all collectors.
+        """
+        key = self._station_key(city)
+        if key not in DataCollector._station_frames:
+            data, error = self._fetch_with_retry(city, geo)
+            DataCollector._station_frames[key] = data
+            if error is not None:
+                DataCollector.failed_stations[city] = error
+
+        return DataCollector._station_frames[key]
+
+    def collect_station_variable(self, variable) -> pd.DataFrame:
+        """
+        Collects one meteo variable (meteostat column name, see METEO_VARIABLES) for all places
+        and calculates the average across them. Failed stations are left out of the average.
+        """
+        self.prefetch_stations()
+        variable_df = pd.DataFrame()
+
+        for city, geo in self._places.items():
+            data = self.fetch_station(city, geo)
+            if data is None:
+                continue
+            variable_df[city] = data[variable]
+
+        variable_df['average'] = variable_df.mean(axis=1)
+
+        return variable_df
+
+    @classmethod
+    def clear_station_cache(cls):
+        """
+        Drops all shared station frames and the failed stations report.
+        """
+        DataCollector._station_frames.clear()
+        DataCollector.failed_stations.clear()
+
+    def data_path(self) -> str:
+        return storage_path(os.path.join(self.storage_path, self.file_name))
+
+    def read_watermark(self) -> pd.Timestamp:
+        """
+        Reads the last stored timestamp of the data file without parsing the whole file.
+        Returns None if the file does not exist or contains no data rows.
+        """
+        path = self.data_path()
+        if not os.path.exists(path):
+            return None
+
+        return read_last_index(path)
+
+    def store_data(self):
+        if self.is_up_to_date:
+            return
+        if self.data is None or self.data.empty:
+            print("No data to store.")
+        elif self._watermark is not None:
+            append_frame(self.data, self.data_path())
         else:
+            write_frame(self.data, self.data_path())
+
+    def store_data_in_csv(self):
+        path = storage_path(os.path.join(self.storage_path, self.file_name), 'csv')
+
+        if self.data is None or self.data.empty:
             print("No data to store.")
+        elif self._watermark is not None:
+            append_frame(self.data, path, export_csv=False)
+        else:
+            self.data.to_csv(path, sep=';')
 
     def _ensure_directory_exists(self):
         """
@@ -81,29 +311,21 @@ class TemperatureData(DataCollector):
         collect_temperature_data():
             Collects hourly temperature data for the specified locations and time period, calculates the 
             average temperature across all locations, and stores the data in a DataFrame.
-        store_temperature_in_csv():
-            Saves the average temperature data to a CSV file named 'temperature_data.csv' in the 'data/external' directory.
+        store_data():
+            Saves the temperature data as 'temperature_data' in the 'data/external' directory.
         temperature_data_view():
             Prints a preview of the average temperature data.
     """
-    def __init__(self):
+    def __init__(self, incremental=False):
         self.file_name = 'temperature_data.csv'
-        super().__init__(self.file_name)
+        super().__init__(self.file_name, incremental)
         self.unit = '°C'  # Temperature unit
-        self.data = self.collect_data()
-        self.store_data_in_csv()
+        self.data = None if self.is_up_to_date else self.collect_data()
+        self.store_data()
         #self.data_preview(self.file_name)
 
     def collect_data(self):
-        temperature_df = pd.DataFrame()
-
-        for city, geo in self._places.items():
-            data = Hourly(geo, self._timestart, self._timeend).fetch()
-            temperature_df[city] = data['temp']
-
-        temperature_df['average'] = temperature_df.mean(axis=1)
-
-        return temperature_df
+        return self.collect_station_variable(METEO_VARIABLES['temperature'])
 
 
 class SunshineData(DataCollector):
@@ -122,30 +344,22 @@ class SunshineData(DataCollector):
             Collects sunshine data for all specified locations within the given time range.
             Returns:
                 pd.DataFrame: A DataFrame containing sunshine data for each location and their average.
-        store_sunshine_in_csv():
-            Stores the average sunshine data for the Czech Republic in a CSV file.
+        store_data():
+            Stores the sunshine data for the Czech Republic in the external data folder.
         sunshine_data_view():
             Displays a preview of the average sunshine data for the Czech Republic.
     """
 
-    def __init__(self):
+    def __init__(self, incremental=False):
         self.file_name ='solar_data.csv'
-        super().__init__(self.file_name)
+        super().__init__(self.file_name, incremental)
         self.unit = 'min/h'
-        self.data = self.collect_data()
-        self.store_data_in_csv()
+        self.data = None if self.is_up_to_date else self.collect_data()
+        self.store_data()
         #self.data_preview(self.file_name)
 
     def collect_data(self):
-        sunshine_df = pd.DataFrame()
-
-        for city, geo in self._places.items():
-            data = Hourly(geo, self._timestart, self._timeend).fetch()
-            sunshine_df[city] = data['tsun']
-
-        sunshine_df['average'] = sunshine_df.mean(axis=1)
-
-        return sunshine_df
+        return self.collect_station_variable(METEO_VARIABLES['sunshine'])
 
 
 class WindData(DataCollector):
@@ -163,29 +377,21 @@ class WindData(DataCollector):
         collect_data():
             Collects wind speed data for specified locations and time periods, calculates the average wind speed
             across all locations, and stores the data in a DataFrame.
-        store_data_in_csv():
-            Saves the average wind speed data to a CSV file.
+        store_data():
+            Saves the average wind speed data to the external data folder.
         data_preview():
             Prints the first few rows of the average wind speed data for visualization.
     """
-    def __init__(self):
+    def __init__(self, incremental=False):
         self.file_name = 'wind_data.csv'
-        super().__init__(self.file_name)
+        super().__init__(self.file_name, incremental)
         self.unit = 'km/h'  # Wind speed unit
-        self.data = self.collect_data()
-        self.store_data_in_csv()
+        self.data = None if self.is_up_to_date else self.collect_data()
+        self.store_data()
         #self.data_preview(self.file_name)
 
     def collect_data(self):
-        wind_df = pd.DataFrame()
-
-        for city, geo in self._places.items():
-            data = Hourly(geo, self._timestart, self._timeend).fetch()
-            wind_df[city] = data['wspd']
-
-        wind_df['average'] = wind_df.mean(axis=1)
-
-        return wind_df
+        return self.collect_station_variable(METEO_VARIABLES['wind_speed'])
 
 
 class CalendarData(DataCollector):
@@ -202,17 +408,17 @@ class CalendarData(DataCollector):
             Initializes the CalendarData object, generates calendar information, stores it as a CSV file, and prints a preview.
         collect_data() -> pd.DataFrame:
             Generates a DataFrame with calendar information including day of the week, weekend status, and holiday status.
-        store_data_in_csv():
-            Saves the generated calendar information to a CSV file.
+        store_data():
+            Saves the generated calendar information to the external data folder.
         data_preview():
             Prints a preview of the generated calendar information.
     """
-    def __init__(self):
+    def __init__(self, incremental=False):
         self.file_name = 'calendar_data.csv'
-        super().__init__(self.file_name)
+        super().__init__(self.file_name, incremental)
         self.cz_holidays = holidays.CZ(years=range(self._timestart.year, self._timeend.year + 1))
-        self.data = self.collect_data()
-        self.store_data_in_csv()
+        self.data = None if self.is_up_to_date else self.collect_data()
+        self.store_data()
         #self.data_preview(self.file_name)
 
     def collect_data(self) -> pd.DataFrame:
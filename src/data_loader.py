@@ -1,29 +1,179 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pandas as pd
 
-from src.data_colector import CalendarData, SunshineData, TemperatureData, WindData
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow only speeds up the CSV parsing
+    pa = None
+
+from src import data_storage
+from src.data_cache import ParsedFrameCache
+from src.data_colector import CalendarData, DataCollector, SunshineData, TemperatureData, WindData
+from src.data_storage import iter_frame, read_frame, storage_format_of, storage_path
+
+
+SOURCES = {  # Raw data sources: file, timestamp column and format, declared column dtypes
+    'consumption': {
+        'path': 'data/raw/consumption_data.csv',
+        'time_column': 'Date',
+        'time_format': '%d.%m.%Y %H:%M',
+        'dtypes': {'Values': 'float64'},
+        'default_dtype': 'float64'
+    },
+    'temperature': {
+        'path': 'data/external/temperature_data.csv',
+        'time_column': 'time',
+        'time_format': 'ISO8601',
+        'dtypes': {},
+        'default_dtype': 'float64'
+    },
+    'calendar': {
+        'path': 'data/external/calendar_data.csv',
+        'time_column': 'time',
+        'time_format': 'ISO8601',
+        'dtypes': {'day_of_week': 'int64', 'is_weekend': 'bool', 'is_holiday': 'bool'},
+        'default_dtype': 'float64'
+    },
+    'solar': {
+        'path': 'data/external/solar_data.csv',
+        'time_column': 'time',
+        'time_format': 'ISO8601',
+        'dtypes': {},
+        'default_dtype': 'float64'
+    },
+    'wind': {
+        'path': 'data/external/wind_data.csv',
+        'time_column': 'time',
+        'time_format': 'ISO8601',
+        'dtypes': {},
+        'default_dtype': 'float64'
+    }
+    }
+
+EXTERNAL_SOURCES = ('temperature', 'calendar', 'solar', 'wind')
+CSV_ENGINE = 'c' if pa is None else 'pyarrow'  # Default pandas CSV engine, the multithreaded Arrow reader when installed
+
+
+def read_source_csv(path: str, source: dict, engine: str = CSV_ENGINE, columns=None) -> pd.DataFrame:
+    """
+    Reads a ';' separated source file with declared column dtypes and an explicit timestamp format,
+    so pandas does not have to infer any of them. With the default engine (pyarrow when installed) 50 years
+    of hourly consumption and temperature data are read in about 0.7 s, the 'c' engine takes about 1.0 s and
+    the former inferring parser about 2.5 s (see benchmarks/parse_benchmark.py).
+    Args:
+        path (str): CSV file to read.
+        source (dict): Source description from SOURCES.
+        engine (str): pandas CSV engine, 'c' or 'pyarrow' (CSV_ENGINE by default).
+        columns (list): Columns to parse besides the timestamp column, None parses all of them.
+    Returns:
+        pd.DataFrame: Data indexed by 'datetime'.
+    Raises:
+        KeyError: If the timestamp column is missing in the file.
+    """
+    usecols = None if columns is None else [source['time_column'], *columns]
+    load_data = pd.read_csv(path, sep=';', dtype=_source_dtypes(path, source), usecols=usecols, engine=engine, encoding='utf-8-sig')
+
+    return _index_by_time(load_data, source)
+
+
+def iter_source_csv(path: str, source: dict, chunksize: int, columns=None):
+    """
+    Reads a source file in time-ordered chunks of at most 'chunksize' rows with the same typing as read_source_csv,
+    so the memory needed does not depend on the length of the file.
+    Yields:
+        pd.DataFrame: Chunks indexed by 'datetime'.
+    """
+    usecols = None if columns is None else [source['time_column'], *columns]
+    reader = pd.read_csv(path, sep=';', dtype=_source_dtypes(path, source), usecols=usecols, encoding='utf-8-sig', chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield _index_by_time(chunk, source)
+
+
+def _source_dtypes(path: str, source: dict) -> dict:
+    """
+    Returns the declared dtypes of all columns in the header of 'path', the timestamp column is read as text.
+    Raises:
+        KeyError: If the timestamp column is missing in the file.
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        columns = f.readline().strip().split(';')
+
+    time_column = source['time_column']
+    if time_column not in columns:
+        raise KeyError(time_column)
+
+    dtypes = {column: source['dtypes'].get(column, source['default_dtype']) for column in columns}
+    dtypes[time_column] = 'str'
+
+    return dtypes
+
+
+def _index_by_time(load_data: pd.DataFrame, source: dict) -> pd.DataFrame:
+    time_column = source['time_column']
+    load_data.index = pd.DatetimeIndex(_parse_timestamps(load_data.pop(time_column), source['time_format']), name='datetime')
+
+    return load_data
+
+
+def _parse_timestamps(values: pd.Series, time_format: str):
+    """
+    Parses timestamps with an explicit format. Non-ISO formats go through the vectorized Arrow strptime
+    whenever pyarrow is installed (with either CSV engine), which is about 20x faster than the pandas
+    strptime used for them otherwise (the consumption hours are not zero-padded, e.g. '1.1.2023 0:00').
+    """
+    if pa is not None and time_format != 'ISO8601':
+        parsed = pc.strptime(pa.array(values.to_numpy(dtype=object)), format=time_format, unit='us')
+        return parsed.to_pandas()
+
+    return pd.to_datetime(values, format=time_format)
 
 
 class RawData:
     """
     RawData Class
     This class is responsible for loading and managing raw data from various sources, including consumption, temperature, calendar, solar, and wind data. It provides methods to load data from CSV files and retrieve the loaded data as pandas DataFrames.
+    Every source is loaded on first access and memoized, so in lazy mode only the sources a caller actually uses are parsed.
     Attributes:
         raw_consumption_data (pd.DataFrame): DataFrame containing raw consumption data.
         raw_temperatur_data (pd.DataFrame): DataFrame containing raw temperature data.
         raw_calendar_data (pd.DataFrame): DataFrame containing raw calendar data.
         raw_solar_data (pd.DataFrame): DataFrame containing raw solar data.
         raw_wind_data (pd.DataFrame): DataFrame containing raw wind data.
+        raw_data (dict): All five sources keyed by their name (loads the missing ones).
+        load_times (dict): Load time in seconds of every loaded source.
+    Args:
+        incremental (bool): If True, the external collectors only fetch and append the hours missing
+                            after the last stored timestamp of each external file.
+        lazy (bool): If True, no data is collected and no file is parsed on construction. Collection is an explicit
+                     step (collect_external_data) and every source is loaded on its first access.
+        engine (str): pandas CSV engine used by the loaders, 'c' or 'pyarrow' (CSV_ENGINE, pyarrow when installed).
+        parse_cache (bool): If True (and pyarrow is installed), parsed CSV sources are cached in a binary
+                            '<file>.parsed.feather' next to the source and rebuilt only when the source changes.
+        parallel (bool): If True, the sources are loaded concurrently on a process pool when not lazy.
     Methods:
-        _consumption_data_loader(path: str) -> pd.DataFrame:
-            Private method to load consumption data from a CSV file.
-        _temperatur_data_loader(path: str) -> pd.DataFrame:
-            Private method to load temperature data from a CSV file.
-        _calendar_data_loader(path: str) -> pd.DataFrame:
-            Private method to load calendar data from a CSV file.
-        _solar_data_loader(path: str) -> pd.DataFrame:
-            Private method to load solar data from a CSV file.
-        _wind_data_loader(path: str) -> pd.DataFrame:
-            Private method to load wind data from a CSV file.
+        collect_external_data(incremental: bool = False):
+            Runs the external collectors and drops the memoized external sources.
+        load_source(name: str, columns: list = None, start=None, end=None) -> pd.DataFrame:
+            Returns one source, loading it on first access. Projected or bounded reads are not memoized.
+        load_sources(names: list = None, parallel: bool = False, max_workers: int = None, pool: str = 'process') -> dict:
+            Loads several sources (all by default), optionally in parallel, and reports their load times.
+        iter_consumption_chunks(chunksize: int) -> Iterator[pd.DataFrame]:
+            Streams the consumption data in time-ordered chunks with a row budget, without memoizing it.
+        iter_source_chunks(name: str, chunksize: int, columns: list = None) -> Iterator[pd.DataFrame]:
+            Streams any source in time-ordered chunks with a row budget, without memoizing it.
+        source_windows(name: str, columns: list = None, chunksize: int = 100_000) -> SourceWindows:
+            Returns a reader of consecutive time windows of a source, without memoizing it.
+        _load_file(name: str, path: str) -> pd.DataFrame:
+            Private method to load the whole file of a source, the storage format is given by the file extension.
+        _csv_data_loader(path: str, source: dict) -> pd.DataFrame:
+            Private method to load any source CSV file with the timestamp format and dtypes declared in SOURCES.
+        _columnar_data_loader(path: str, columns: list = None, start=None, end=None) -> pd.DataFrame:
+            Private method to load data stored in a columnar format (Parquet/Feather), optionally projected and bounded.
         get_raw_consumption_data() -> pd.DataFrame:
             Public method to retrieve the raw consumption data.
         get_raw_temperatur_data() -> pd.DataFrame:
@@ -35,127 +185,216 @@ class RawData:
         get_raw_calendar_data() -> pd.DataFrame:
             Public method to retrieve the raw calendar data.
     """
-    def __init__(self):
-        # collect data from external sources and store in external data folder
-        TemperatureData()
-        SunshineData()
-        WindData()
-        CalendarData()
-
-        self.raw_consumption_data = self._consumption_data_loader('data/raw/consumption_data.csv')
-        self.raw_temperatur_data = self._temperatur_data_loader('data/external/temperature_data.csv')
-        self.raw_calendar_data = self._calendar_data_loader('data/external/calendar_data.csv')
-        self.raw_solar_data = self._solar_data_loader('data/external/solar_data.csv')
-        self.raw_wind_data = self._wind_data_loader('data/external/wind_data.csv')
-        self.raw_data = {
-            'consumption': self.raw_consumption_data,
-            'temperature': self.raw_temperatur_data,
-            'calendar': self.raw_calendar_data,
-            'solar': self.raw_solar_data,
-            'wind': self.raw_wind_data
-        }
-
-    def _consumption_data_loader(self, path: str) -> pd.DataFrame:
-        try:
-            load_data = pd.read_csv(path, sep=';', parse_dates=['Date'], dayfirst=True)
-            load_data.rename(columns={'Date': 'datetime'}, inplace=True)
-            load_data.set_index('datetime', inplace=True)
-            print(f"Data from {path} successfully loaded.")
+    def __init__(self, incremental=False, lazy=False, engine=CSV_ENGINE, parse_cache=True, parallel=False):
+        self.engine = engine
+        self.parse_cache = ParsedFrameCache() if parse_cache and data_storage.pa is not None else None
+        self.load_times = {}
+        self._sources = {}
+        if not lazy:
+            self.collect_external_data(incremental)
+            self.load_sources(parallel=parallel)
 
-        except FileNotFoundError:
-            print(f"File {path} not found.")
-            exit(1)
-        except ValueError as e:
-            if "Missing column provided to 'parse_dates': 'Date'" in str(e):
-                print(f"Column 'Date' not found in the file {path} .")
-                exit(1)
+    def collect_external_data(self, incremental=False) -> None:
+        """
+        Collects data from external sources and stores it in the external data folder.
+        """
+        TemperatureData(incremental)
+        SunshineData(incremental)
+        WindData(incremental)
+        CalendarData(incremental)
+        if DataCollector.failed_stations:
+            print(f"Warning: Stations failed during collection: {', '.join(DataCollector.failed_stations)}")
+        cache = getattr(DataCollector.backend, 'cache', None)
+        if cache is not None:
+            print(f"Meteostat cache: {cache.stats()}")
+
+        # External files changed, memoized external sources are stale
+        for name in EXTERNAL_SOURCES:
+            self._sources.pop(name, None)
+
+    def load_source(self, name: str, columns=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Returns the source 'name' (see SOURCES), loading it only on the first access.
+        With a column projection or inclusive time bounds ('start', 'end') only that part is returned and nothing
+        is memoized: a memoized source is sliced, a columnar file reads only those columns and row groups,
+        a CSV file parses only those columns (or is sliced from its parse cache).
+        """
+        if name not in self._sources and (columns is not None or start is not None or end is not None):
+            path = self._source_path(name)
+            if storage_format_of(path) != 'csv':
+                return self._columnar_data_loader(path, columns, start, end)
+            load_data = self._csv_data_loader(path, SOURCES[name], columns)
+        else:
+            if name not in self._sources:
+                start_time = time.perf_counter()
+                self._sources[name] = self._load_file(name, self._source_path(name))
+                self.load_times[name] = time.perf_counter() - start_time
+            load_data = self._sources[name]
+
+        if start is not None or end is not None:
+            load_data = load_data.loc[start:end]
+        return load_data if columns is None else load_data[list(columns)]
+
+    @staticmethod
+    def _source_path(name: str) -> str:
+        """
+        Returns the file of the source 'name', external sources are stored in the configured storage format.
+        """
+        path = SOURCES[name]['path']
+        if name in EXTERNAL_SOURCES:
+            path = storage_path(path)
+
+        return path
+
+    def _load_file(self, name: str, path: str) -> pd.DataFrame:
+        """
+        Loads the whole file 'path' of the source 'name', its storage format is given by the extension.
+        """
+        if storage_format_of(path) == 'csv':
+            return self._csv_data_loader(path, SOURCES[name])
+
+        return self._columnar_data_loader(path)
+
+    def load_sources(self, names=None, parallel=False, max_workers=None, pool='process') -> dict:
+        """
+        Loads the given sources (all by default) and prints the load time of each of them.
+        With parallel=True the independent sources are loaded concurrently. The 'process' pool avoids the GIL,
+        which the text and timestamp conversions of the CSV parsers hold for most of their work, so the
+        wall-clock time approaches the time of the slowest source. The 'thread' pool has no start-up and
+        transfer cost and is preferable for memory-mapped columnar or cached sources.
+        Returns:
+            dict: The loaded sources keyed by their name, like get_raw_data().
+        """
+        names = list(SOURCES) if names is None else list(names)
+        start = time.perf_counter()
+        missing = [name for name in names if name not in self._sources]
+        if parallel and len(missing) > 1:
+            if pool == 'process':
+                # The paths are resolved here: a spawned worker would see the default storage format
+                with ProcessPoolExecutor(max_workers=max_workers or len(missing)) as executor:
+                    results = executor.map(_load_source_in_process, missing, [self._source_path(name) for name in missing],
+                                           [self.engine] * len(missing), [self.parse_cache is not None] * len(missing))
+                    for name, (data, load_time) in zip(missing, results):
+                        self._sources[name] = data
+                        self.load_times[name] = load_time
             else:
-                raise
+                with ThreadPoolExecutor(max_workers=max_workers or len(missing)) as executor:
+                    list(executor.map(self.load_source, missing))
+        loaded = {name: self.load_source(name) for name in names}
+        elapsed = time.perf_counter() - start
 
-        return load_data
-    
-    def _temperatur_data_loader(self, path: str) -> pd.DataFrame:
-        try:
-            load_data = pd.read_csv(path, sep=';', parse_dates=['time'], dayfirst=True)
-            load_data.rename(columns={'time': 'datetime'}, inplace=True)
-            load_data.set_index('datetime', inplace=True)
-            print(f"Data from {path} successfully loaded.")
+        times = ', '.join(f"{name} {self.load_times.get(name, 0.0):.3f} s" for name in names)
+        print(f"Sources loaded in {elapsed:.3f} s ({pool + ' pool' if parallel else 'sequential'}): {times}")
 
-        except FileNotFoundError:
-            print(f"File {path} not found.")
-            exit(1)
-        except ValueError as e:
-            if "Missing column provided to 'parse_dates': 'time'" in str(e):
-                print(f"Column 'time' not found in the file {path}.")
+        return loaded
+
+    def iter_consumption_chunks(self, chunksize=100_000):
+        """
+        Streams the consumption file in time-ordered chunks of at most 'chunksize' rows.
+        Memoized consumption data is reused, otherwise the file is read chunk by chunk and nothing is kept,
+        so the memory needed stays bounded by the row budget no matter how long the history is.
+        """
+        return self.iter_source_chunks('consumption', chunksize)
+
+    def iter_source_chunks(self, name: str, chunksize=100_000, columns=None):
+        """
+        Streams the source 'name' in time-ordered chunks of at most 'chunksize' rows, optionally projected to 'columns'.
+        A memoized source is reused, a CSV file is read chunk by chunk and a columnar file batch by batch,
+        nothing is kept.
+        """
+        if name in self._sources:
+            data = self.load_source(name, columns)
+            for start in range(0, len(data), chunksize):
+                yield data.iloc[start:start + chunksize]
+            return
+
+        source = SOURCES[name]
+        path = self._source_path(name)
+        if storage_format_of(path) != 'csv':
+            try:
+                for chunk in iter_frame(path, chunksize, columns):
+                    chunk.index.name = 'datetime'
+                    yield chunk
+            except FileNotFoundError:
+                print(f"File {path} not found.")
                 exit(1)
-            else:
-                raise
+            return
 
-        return load_data 
-    
-    def _calendar_data_loader(self, path: str) -> pd.DataFrame:
         try:
-            load_data = pd.read_csv(path, sep=';', parse_dates=['time'], dayfirst=True)
-            load_data.rename(columns={'time': 'datetime'}, inplace=True)
-            load_data.set_index('datetime', inplace=True)
-            print(f"Data from {path} successfully loaded.")
-
+            yield from iter_source_csv(path, source, chunksize, columns)
         except FileNotFoundError:
             print(f"File {path} not found.")
             exit(1)
-        except ValueError as e:
-            if "Missing column provided to 'parse_dates': 'time'" in str(e):
-                print(f"Column 'time' not found in the file{path} .")
-                exit(1)
-            else:
-                raise
+        except KeyError:
+            print(f"Column '{source['time_column']}' not found in the file {path}.")
+            exit(1)
 
-        return load_data   
-    
-    def _solar_data_loader(self, path: str) -> pd.DataFrame:
+    def source_windows(self, name: str, columns=None, chunksize=100_000) -> 'SourceWindows':
+        """
+        Returns a reader of consecutive time windows of the source 'name' (see SourceWindows).
+        """
+        return SourceWindows(self.iter_source_chunks(name, chunksize, columns))
+
+    @property
+    def raw_consumption_data(self) -> pd.DataFrame:
+        return self.load_source('consumption')
+
+    @property
+    def raw_temperatur_data(self) -> pd.DataFrame:
+        return self.load_source('temperature')
+
+    @property
+    def raw_calendar_data(self) -> pd.DataFrame:
+        return self.load_source('calendar')
+
+    @property
+    def raw_solar_data(self) -> pd.DataFrame:
+        return self.load_source('solar')
+
+    @property
+    def raw_wind_data(self) -> pd.DataFrame:
+        return self.load_source('wind')
+
+    @property
+    def raw_data(self) -> dict:
+        return {name: self.load_source(name) for name in SOURCES}
+
+    def _columnar_data_loader(self, path: str, columns=None, start=None, end=None) -> pd.DataFrame:
         try:
-            load_data = pd.read_csv(path, sep=';', parse_dates=['time'], dayfirst=True)
-            load_data.rename(columns={'time': 'datetime'}, inplace=True)
-            load_data.set_index('datetime', inplace=True)
+            load_data = read_frame(path, columns=columns, start=start, end=end)
+            load_data.index.name = 'datetime'
             print(f"Data from {path} successfully loaded.")
 
         except FileNotFoundError:
             print(f"File {path} not found.")
             exit(1)
-        except ValueError as e:
-            if "Missing column provided to 'parse_dates': 'time'" in str(e):
-                print(f"Column 'time' not found in the file{path} .")
-                exit(1)
-            else:
-                raise
 
         return load_data
-    
-    def _wind_data_loader(self, path: str) -> pd.DataFrame:
+
+    def _csv_data_loader(self, path: str, source: dict, columns=None) -> pd.DataFrame:
         try:
-            load_data = pd.read_csv(path, sep=';', parse_dates=['time'], dayfirst=True)
-            load_data.rename(columns={'time': 'datetime'}, inplace=True)
-            load_data.set_index('datetime', inplace=True)
-            print(f"Data from {path} successfully loaded.)")
+            if self.parse_cache is not None:
+                # The cache holds the whole parsed file, a projection is taken from it
+                key = json.dumps({'source': source, 'engine': self.engine}, sort_keys=True)
+                load_data = self.parse_cache.load(path, key, lambda: read_source_csv(path, source, self.engine))
+            else:
+                load_data = read_source_csv(path, source, self.engine, columns)
+            print(f"Data from {path} successfully loaded.")
 
         except FileNotFoundError:
             print(f"File {path} not found.")
             exit(1)
-        except ValueError as e:
-            if "Missing column provided to 'parse_dates': 'time'" in str(e):
-                print(f"Column 'time' not found in the file.{path} ")
-                exit(1)
-            else:
-                raise
+        except KeyError:
+            print(f"Column '{source['time_column']}' not found in the file {path}.")
+            exit(1)
 
         return load_data
-    
-    
+
     def get_raw_consumption_data(self) -> pd.DataFrame:
         return self.raw_consumption_data
     
     def get_raw_temperatur_data(self) -> pd.DataFrame:
-        return self.raw_consumption_data
+        return self.raw_temperatur_data
     
     def get_raw_solar_data(self) -> pd.DataFrame:
         return self.raw_solar_data    
@@ -170,3 +409,49 @@ class RawData:
         return self.raw_data
     
 
+class SourceWindows:
+    """
+    Reads consecutive time windows of a source from its chunk stream, for a consumer walking forward in time
+    (e.g. the external sources alongside the consumption chunks of ProcessedData.process_in_chunks).
+    The stream is advanced only as far as the requested window and the rows before it are dropped,
+    so at most one chunk beyond the window is held in memory.
+    Methods:
+        read(start, end) -> pd.DataFrame:
+            Returns the rows between 'start' and 'end' (inclusive). Windows must not move backwards.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = None
+        self._exhausted = False
+
+    def read(self, start, end) -> pd.DataFrame:
+        # A row equal to 'end' may be repeated in the next chunk (an hour repeated when DST ends)
+        while not self._exhausted and (self._buffer is None or self._buffer.empty or self._buffer.index[-1] <= end):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+            else:
+                self._buffer = chunk if self._buffer is None else pd.concat([self._buffer, chunk])
+
+        if self._buffer is None:
+            return pd.DataFrame()
+        index = self._buffer.index
+        window = self._buffer[(index >= start) & (index <= end)]
+        self._buffer = self._buffer[index > end]
+
+        return window
+
+
+def _load_source_in_process(name: str, path: str, engine: str, parse_cache: bool) -> tuple:
+    """
+    Loads one source in a worker process of RawData.load_sources.
+    The file 'path' is resolved by the parent, so the storage format set there (see data_storage.set_storage_format)
+    applies even when the worker is spawned and imports the module defaults.
+    Returns:
+        tuple: The loaded source and its load time in seconds.
+    """
+    raw_data = RawData(lazy=True, engine=engine, parse_cache=parse_cache)
+    start = time.perf_counter()
+    data = raw_data._load_file(name, path)
+
+    return data, time.perf_counter() - start
@@ -5,6 +5,8 @@ from sklearn.metrics import mean_absolute_error
 from xgboost import XGBRegressor
 import joblib
 
+from src.data_schema import FEATURE_SCHEMA, apply_schema
+
 class EnergyPredictor:
     def __init__(self, db_path, table_name='energy_data'):
         self.db_path = db_path
@@ -33,9 +35,8 @@ class EnergyPredictor:
         X = df.drop(columns=['consumption', 'timestamp'])
         y = df['consumption']
 
-        X = X.select_dtypes(include=['number', 'bool', 'category'])
-        self.X = X
-        self.y = y
+        self.X = apply_schema(X[list(FEATURE_SCHEMA)], FEATURE_SCHEMA)
+        self.y = y.astype('float32')
         print("Data preprocessed")
 
     def split_data(self, test_size=0.2):
@@ -88,7 +89,7 @@ def load_last_week_data_from_db(db_path, table_name='energy_data'):
 
 def predict_last_week(predictor, last_week):
     X = last_week.drop(columns=['consumption'], errors='ignore')
-    X = X.select_dtypes(include=['number', 'bool', 'category'])
+    X = apply_schema(X[list(FEATURE_SCHEMA)], FEATURE_SCHEMA)
     predictions = predictor.predict(X)
     last_week = last_week.copy()
     last_week['predicted_consumption'] = predictions
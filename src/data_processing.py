@@ -1,111 +1,364 @@
-import copy
+import os
+
+import numpy as np
 import pandas as pd
 
 from src.data_loader import RawData
+from src.data_quality import DataQualityReport, check_data_quality
+from src.data_schema import apply_schema, memory_report
+from src.data_storage import FrameWriter, read_last_index, storage_path, upsert_frame, write_frame
+
+SELECTED_COLUMNS = {  # Columns taken from every raw source and their names in the merged data
+    'consumption': {'Values': 'consumption'},
+    'temperature': {'average': 'temperature_average'},
+    'solar': {'average': 'solar_average'},
+    'wind': {'average': 'wind_average'},
+    'calendar': {'day_of_week': 'day_of_week', 'is_weekend': 'is_weekend', 'is_holiday': 'is_holiday'}
+    }
+
+PROCESSING_OVERLAP = pd.Timedelta(hours=48)  # Already processed hours reprocessed in incremental mode (late corrections)
+MAX_FILL_GAP = 3  # Longest gap in hours which is filled by interpolation
+
+
+def select_sources(raw_data: dict) -> dict:
+    """
+    Takes only the selected columns of every given raw source under their merged names.
+    Only these columns are copied, the raw frames are left untouched.
+    """
+    return {key: raw_data[key][list(columns)].rename(columns=columns)
+            for key, columns in SELECTED_COLUMNS.items() if key in raw_data}
+
+
+def load_selected_sources(raw_data: RawData, start=None, end=None) -> dict:
+    """
+    Loads only the selected columns (see SELECTED_COLUMNS) of every raw source between the inclusive bounds
+    'start' and 'end'. Columnar sources read just these columns and row groups, nothing extra is memoized.
+    """
+    return {key: raw_data.load_source(key, columns=list(columns), start=start, end=end)
+            for key, columns in SELECTED_COLUMNS.items()}
+
+
+def align_sources(data: dict, index: pd.DatetimeIndex = None) -> pd.DataFrame:
+    """
+    Aligns all sources onto the hourly index of the consumption data in a single reindex/concat pass
+    (same result as left merges on the consumption index). The sources must have unique indices.
+    If 'index' is given (e.g. a complete hourly grid), all sources, the consumption included, are aligned onto it.
+    """
+    consumption = data['consumption']
+    if not isinstance(consumption.index, pd.DatetimeIndex):
+        consumption = consumption.set_axis(pd.to_datetime(consumption.index))
+    if index is None:
+        index = consumption.index
+    else:
+        consumption = consumption.reindex(index)
+
+    frames = [consumption]
+    for key in SELECTED_COLUMNS:
+        if key == 'consumption':
+            continue
+        frame = data[key]
+        if not isinstance(frame.index, pd.DatetimeIndex):
+            frame = frame.set_axis(pd.to_datetime(frame.index))
+        frames.append(frame.reindex(index))
+
+    return pd.concat(frames, axis=1)
+
+
+def hourly_grid(index: pd.DatetimeIndex, start=None) -> pd.DatetimeIndex:
+    """
+    Returns the complete hourly grid from 'start' (the first timestamp of 'index' by default)
+    to the last timestamp of 'index'. The grid is in local wall-clock time like the raw data, so the hour
+    skipped when DST starts is part of it and the hour repeated when DST ends appears once.
+    Hours between 'start' and the first timestamp of 'index' are part of the grid (a gap at the start).
+    """
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(pd.to_datetime(index))
+    if index.empty:
+        return index
+    start = index.min() if start is None else pd.Timestamp(start)
+
+    return pd.date_range(start.ceil('h'), index.max(), freq='h', unit=index.unit, name=index.name)
+
+
+def complete_timestamps(chunks):
+    """
+    Re-chunks time-ordered chunks so that all rows of a timestamp are in the same chunk: the rows of the last
+    timestamp of every chunk are held back and prepended to the next one (e.g. the hour repeated when DST ends
+    split by a chunk boundary, whose rows are averaged by ProcessedData.check_time_line).
+    Yields:
+        pd.DataFrame: Non-empty chunks, no timestamp spans two of them.
+    """
+    held = None
+    for chunk in chunks:
+        if held is not None:
+            chunk = pd.concat([held, chunk])
+        if chunk.empty:
+            continue
+        last = chunk.index[-1] == chunk.index
+        held = chunk[last]
+        if not last.all():
+            yield chunk[~last]
+    if held is not None:
+        yield held
+
+
+def fill_gaps(data: pd.DataFrame, max_gap=MAX_FILL_GAP, added=None) -> pd.DataFrame:
+    """
+    Fills gaps of at most 'max_gap' hours in the float columns by linear interpolation and flags the filled rows.
+    Longer gaps and gaps at the edges are left empty. Rows 'added' by the reindexing to the hourly grid whose
+    consumption could not be filled are dropped. Every step is a vectorized pass over the whole columns.
+    Args:
+        data (pd.DataFrame): Data on a complete hourly grid.
+        max_gap (int): Longest gap in hours which is filled.
+        added (np.ndarray): Boolean mask of the rows inserted by the reindexing, they are flagged as filled.
+    Returns:
+        pd.DataFrame: The data with the boolean column 'is_filled'.
+    """
+    filled = np.zeros(len(data), dtype=bool) if added is None else np.asarray(added, dtype=bool).copy()
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if not pd.api.types.is_float_dtype(values.dtype):
+            continue
+        missing = values.isna().to_numpy()
+        if not missing.any():
+            continue
+        fill = _short_gaps(missing, max_gap)
+        if fill.any():
+            columns[column] = values.mask(fill, values.interpolate(method='linear', limit_area='inside'))
+            filled |= fill
+
+    data = data.assign(**columns, is_filled=filled)
+    if added is not None and 'consumption' in data.columns:
+        data = data[~(np.asarray(added, dtype=bool) & data['consumption'].isna().to_numpy())]
+
+    return data
+
+
+def _short_gaps(missing: np.ndarray, max_gap) -> np.ndarray:
+    """
+    Returns the mask of the missing values in runs of at most 'max_gap' with values on both sides.
+    """
+    edges = np.diff(np.r_[0, missing.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    short = (ends - starts <= max_gap) & (starts > 0) & (ends < len(missing))
+
+    # +1 at the start and -1 after the end of every short run, the running sum marks the runs
+    marks = np.zeros(len(missing) + 1, dtype=np.int8)
+    marks[starts[short]] += 1
+    marks[ends[short]] -= 1
+
+    return np.cumsum(marks[:-1]) > 0
 
 
 class ProcessedData:
-    def __init__(self, raw_data: RawData):
-        self.raw_data = raw_data.get_raw_data() # Store the raw data from RawData instance
+    """
+    Merges the raw sources into the hourly dataset stored in data/processed.
+    Args:
+        raw_data (RawData): Raw data to process.
+        chunksize (int): If set, the consumption history is processed and written in chunks of this many rows.
+        incremental (bool): If True, only the raw rows after the newest processed timestamp (minus the overlap window)
+                            are processed and upserted into the stored merged data.
+        overlap (pd.Timedelta): Overlap window of the incremental mode, its rows are reprocessed and overwritten.
+        max_gap (int): Longest gap in hours filled by the repair stage (see fill_gaps). None disables the stage,
+                       the merged data then keeps the timestamps of the consumption file.
+    Methods:
+        process_in_chunks(raw_data: RawData, chunksize: int, path: str) -> int:
+            Processes and writes the merged data chunk by chunk.
+        process_incrementally(raw_data: RawData, path: str, overlap: pd.Timedelta) -> int:
+            Processes only the new hours and upserts them into the stored merged data.
+        memory_report() -> pd.DataFrame:
+            Returns the memory footprint of the merged data per column.
+    """
+    def __init__(self, raw_data: RawData, chunksize=None, incremental=False, overlap=PROCESSING_OVERLAP, max_gap=MAX_FILL_GAP):
+        self.max_gap = max_gap
+        if incremental:
+            self.process_incrementally(raw_data, 'data/processed/merged_data.csv', overlap)
+            return
+
+        if chunksize is not None:
+            # Streaming mode, the merged data is written chunk by chunk and not kept in memory
+            self.merged_data = None
+            self.process_in_chunks(raw_data, chunksize, 'data/processed/merged_data.csv')
+            return
+
+        self.raw_data = load_selected_sources(raw_data) # Store the selected raw data from RawData instance
         self.data = self.pick_raw_data()
-        self.rename_average_columns()
         self.run_data_checkers()
         self.merged_data = self.merge_raw_data()
         self.save_merged_data('data/processed/merged_data.csv')
 
     def pick_raw_data(self) -> dict:
-        data = copy.deepcopy(self.raw_data)
-        data = {
-            'consumption': data['consumption'],
-            'temperature': data['temperature'][['average']],
-            'calendar': data['calendar'],
-            'solar': data['solar'][['average']],
-            'wind': data['wind'][['average']]
-        }
-        
-        return data
-    
-    def rename_average_columns(self) -> None:
         """
-        Renames the 'average' columns in the data to more descriptive names.
+        Picks the selected columns of the raw data under their descriptive names (see SELECTED_COLUMNS).
+        """
+        return select_sources(self.raw_data)
+
+    def process_in_chunks(self, raw_data: RawData, chunksize: int, path: str) -> int:
+        """
+        Processes the consumption history in time-ordered chunks of at most 'chunksize' rows and writes
+        every merged chunk straight to the processed data file. The selected columns of the external sources
+        are read window by window alongside the consumption (see RawData.source_windows), so only the current
+        chunk of every source is held in memory and the peak memory stays flat for any length of history.
+        The result equals the merge of the whole history for any chunk size: all rows of a timestamp are merged
+        in the same chunk (see complete_timestamps), the hourly grid continues from the previous chunk, and the
+        last max_gap + 1 rows of a chunk are held back until the next chunk decides whether their gaps are filled.
+        Args:
+            raw_data (RawData): Raw data, preferably lazy so the consumption file is not loaded as a whole.
+            chunksize (int): Row budget of one consumption chunk.
+            path (str): The file path where the merged data will be saved, the extension follows the storage format.
+        Returns:
+            int: Number of merged rows written.
+        """
+        # The external sources are read window by window alongside the consumption chunks
+        external = {key: raw_data.source_windows(key, list(columns), chunksize)
+                    for key, columns in SELECTED_COLUMNS.items() if key != 'consumption'}
+        # Rows on either side of a gap which decide whether it is filled (see fill_gaps)
+        context = 0 if self.max_gap is None else self.max_gap + 1
+
+        path = storage_path(path)
+        chunks = (chunk[list(SELECTED_COLUMNS['consumption'])].rename(columns=SELECTED_COLUMNS['consumption'])
+                  for chunk in raw_data.iter_consumption_chunks(chunksize))
+        grid_start = None
+        carried, carried_added, carried_written = None, None, 0
+        reports = []
+        with FrameWriter(path) as writer:
+            for chunk in complete_timestamps(chunks):
+                if self.max_gap is None:
+                    start, end = chunk.index[0], chunk.index[-1]
+                else:
+                    grid = hourly_grid(chunk.index, grid_start)
+                    start, end = grid[0], grid[-1]
+                self.data = {'consumption': chunk,
+                             **select_sources({key: windows.read(start, end) for key, windows in external.items()})}
+
+                reports.append(check_data_quality(self.data))
+                self.check_time_line()
+                if self.max_gap is None:
+                    self._write_merged(writer, align_sources(self.data))
+                    continue
+
+                # The held back rows of the previous chunk (and the written rows before them as context) lead the grid
+                aligned = align_sources(self.data, grid)
+                added = ~grid.isin(self.data['consumption'].index)
+                if carried is not None:
+                    aligned = pd.concat([carried, aligned])
+                    added = np.concatenate([carried_added, added])
+                written = max(carried_written, len(aligned) - context)
+                if written > carried_written:
+                    merged = fill_gaps(aligned, self.max_gap, added)
+                    self._write_merged(writer, merged.loc[aligned.index[carried_written]:aligned.index[written - 1]])
+
+                keep = max(0, written - context)
+                carried, carried_added, carried_written = aligned.iloc[keep:], added[keep:], written - keep
+                grid_start = end + pd.Timedelta(hours=1)
+
+            if carried is not None and len(carried) > carried_written:
+                merged = fill_gaps(carried, self.max_gap, carried_added)
+                self._write_merged(writer, merged.loc[carried.index[carried_written]:])
+
+        self.quality_report = DataQualityReport.combine(reports)
+        print(f"Data checkers completed: {self.quality_report.summary()}")
+        print(f"Merged data saved to {path} ({writer.rows} rows in chunks of {chunksize}).")
+        return writer.rows
+
+    @staticmethod
+    def _write_merged(writer: FrameWriter, merged: pd.DataFrame) -> None:
+        """
+        Writes merged rows in the compact merged schema, a chunk whose rows were all dropped is skipped.
+        """
+        if len(merged):
+            writer.write(apply_schema(merged))
+
+    def process_incrementally(self, raw_data: RawData, path: str, overlap=PROCESSING_OVERLAP) -> int:
+        """
+        Processes only the raw rows newer than the last processed timestamp minus the overlap window
+        and upserts them into the stored merged data, so a refresh scales with the new data only.
+        Without stored merged data everything is processed.
+        Args:
+            raw_data (RawData): Raw data to process.
+            path (str): The file path of the merged data, the extension follows the storage format.
+            overlap (pd.Timedelta): Already processed hours which are processed again to pick up late corrections.
+        Returns:
+            int: Number of merged rows written.
         """
-        self.data['consumption'].rename(columns={'Values': 'consumption'}, inplace=True)
-        self.data['temperature'].rename(columns={'average': 'temperature_average'}, inplace=True)
-        self.data['solar'].rename(columns={'average': 'solar_average'}, inplace=True)
-        self.data['wind'].rename(columns={'average': 'wind_average'}, inplace=True)
-        print("Average columns renamed successfully.")
+        path = storage_path(path)
+        watermark = read_last_index(path) if os.path.exists(path) else None
+        start = None
+        if watermark is None:
+            self.raw_data = load_selected_sources(raw_data)
+        else:
+            since = watermark - overlap
+            self.raw_data = {key: df[df.index > since] for key, df in load_selected_sources(raw_data, since).items()}
+            start = since + pd.Timedelta(hours=1)
+
+        self.data = self.pick_raw_data()
+        self.run_data_checkers()
+        self.merged_data = self.merge_raw_data(start)
+        if watermark is None:
+            self.save_merged_data(path)
+            return len(self.merged_data)
+        if self.merged_data.empty:
+            print(f"{path} is up to date (last processed hour {watermark}).")
+            return 0
+
+        upsert_frame(self.merged_data, path)
+        new_rows = int((self.merged_data.index > watermark).sum())
+        print(f"Merged data updated in {path}: {len(self.merged_data) - new_rows} hours reprocessed, {new_rows} hours added.")
+        return len(self.merged_data)
 
     def save_merged_data(self, path: str) -> None:
         """
-        Saves the merged raw data to a CSV file.
+        Saves the merged raw data in the configured storage format (see src.data_storage).
         Args:
-            path (str): The file path where the merged data will be saved.
+            path (str): The file path where the merged data will be saved, the extension follows the storage format.
         """
-        self.merged_data.to_csv(path, sep=';')
+        path = storage_path(path)
+        write_frame(self.merged_data, path)
         print(f"Merged data saved to {path}.")
     
-    def merge_raw_data(self) -> pd.DataFrame:
-
-        # Ensure indices are of the same type before merging
-        self.data['consumption'].index = pd.to_datetime(self.data['consumption'].index)
-        self.data['temperature'].index = pd.to_datetime(self.data['temperature'].index)
-        self.data['solar'].index = pd.to_datetime(self.data['solar'].index)
-        self.data['wind'].index = pd.to_datetime(self.data['wind'].index)
-        self.data['calendar'].index = pd.to_datetime(self.data['calendar'].index)   
-        
-        # Merge data based on index
-        merged_data = self.data['consumption'].merge(self.data['temperature'], left_index=True, right_index=True, how="left")
-        merged_data = merged_data.merge(self.data['solar'], left_index=True, right_index=True, how="left")
-        merged_data = merged_data.merge(self.data['wind'], left_index=True, right_index=True, how="left")
-        merged_data = merged_data.merge(self.data['calendar'], left_index=True, right_index=True, how="left")
-
-      
-        return merged_data
-        
-    def check_time_line(self) -> pd.DataFrame:
-        # Check if indices are unique for each dataset and update self.data
+    def merge_raw_data(self, start=None) -> pd.DataFrame:
+        """
+        Aligns the sources onto the complete hourly grid of the consumption data from 'start' on (see hourly_grid),
+        fills short gaps (see fill_gaps) and casts the result to the compact merged schema (see src.data_schema).
+        Without the repair stage the sources are aligned onto the consumption timestamps (see align_sources).
+        """
+        if self.max_gap is None:
+            return apply_schema(align_sources(self.data))
+
+        grid = hourly_grid(self.data['consumption'].index, start)
+        added = ~grid.isin(self.data['consumption'].index)
+        return apply_schema(fill_gaps(align_sources(self.data, grid), self.max_gap, added))
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Returns the bytes per column, the total and the bytes per year of the merged data held in memory.
+        """
+        return memory_report(self.merged_data)
+
+    def check_time_line(self) -> None:
+        """
+        Removes duplicate timestamps from every dataset. The consumption of an hour repeated when DST ends
+        is averaged (both hours share one wall-clock timestamp), the other datasets keep the first occurrence.
+        The duplicates are listed in the data quality report.
+        """
         for key in self.data.keys():
             if not self.data[key].index.is_unique:
-                print(f"Warning: Duplicate indices in {key.capitalize()}:", self.data[key].index[self.data[key].index.duplicated()])
-                self.data[key] = self.data[key][~self.data[key].index.duplicated()]
-    
-    def check_missing_values(self) -> pd.DataFrame:
-        """
-        Checks for missing data in the datasets and prints warnings if missing values are found.
-        Returns:
-            DataFrame: A DataFrame containing the count of missing values for each column.
-        """
-        missing_data = {key: df.isnull().sum() for key, df in self.data.items()}
-        
-        for key, missing in missing_data.items():
-            if missing.sum() > 0:
-                print(f"Warning: Missing values detected in {key.capitalize()} dataset:")
-                print(missing[missing > 0])
-        
-        return pd.DataFrame(missing_data)
-
-    def check_data_type(self) -> None:
-        """
-        Checks if all values in each column of the datasets have the same type.
-        Prints warnings if inconsistent types are found.
-        """
-        for key, df in self.data.items():
-            for column in df.columns:
-                unique_types = df[column].map(type).unique()
-                if len(unique_types) > 1:
-                    print(f"Warning: Column '{column}' in {key.capitalize()} dataset has inconsistent types: {unique_types}")
+                if key == 'consumption':
+                    self.data[key] = self.data[key].groupby(level=0, sort=False).mean()
                 else:
-                    pass
-                    #print(f"Column '{column}' in {key.capitalize()} dataset has consistent type: {unique_types[0]}")
+                    self.data[key] = self.data[key][~self.data[key].index.duplicated()]
 
-    def run_data_checkers(self):
+    def run_data_checkers(self) -> DataQualityReport:
         """
-        Runs data checkers to ensure the integrity of the data.
+        Runs the vectorized data checkers (see src.data_quality) and removes duplicate timestamps.
+        Returns:
+            DataQualityReport: Missing values, type consistency, duplicate timestamps, gaps in the hourly grid,
+                               out-of-range values and flat-lined sensors of all datasets.
         """
+        self.quality_report = check_data_quality(self.data)
         self.check_time_line()
-        self.check_missing_values()
-        self.check_data_type()
-        print("Data checkers completed successfully.")
-        
+        print(f"Data checkers completed: {self.quality_report.summary()}")
 
-    
\ No newline at end of file
+        return self.quality_report
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+QUALITY_RULES = {  # Valid range and longest plausible run of identical values (hours) of the merged columns
+    'consumption': {'range': (0, None), 'flatline_hours': 6},
+    'temperature_average': {'range': (-40, 45), 'flatline_hours': 12},
+    'solar_average': {'range': (0, 60), 'flatline_hours': None},  # zero every night
+    'wind_average': {'range': (0, 200), 'flatline_hours': 24},
+    'day_of_week': {'range': (0, 6), 'flatline_hours': None}
+    }
+
+
+class DataQualityReport:
+    """
+    Structured result of the data-quality checks of all sources.
+    Attributes:
+        sources (pd.DataFrame): One row per source with 'rows', 'start', 'end', 'duplicate_timestamps',
+                                'missing_hours' (holes in the hourly grid) and 'largest_gap_hours'.
+        columns (pd.DataFrame): One row per (source, column) with 'dtype', 'consistent_type', 'missing',
+                                'below_range', 'above_range', 'longest_flatline_hours' and 'flatline'.
+    Methods:
+        issues() -> list:
+            Returns human-readable descriptions of all detected problems.
+        is_clean() -> bool:
+            Returns True if no problem was detected.
+        summary() -> str:
+            Returns a one-line overview of the report.
+        combine(reports) -> DataQualityReport:
+            Combines the reports of consecutive chunks of the same data.
+    """
+    def __init__(self, sources: pd.DataFrame, columns: pd.DataFrame):
+        self.sources = sources
+        self.columns = columns
+
+    def issues(self) -> list:
+        issues = []
+        for source, row in self.sources.iterrows():
+            if row['duplicate_timestamps']:
+                issues.append(f"{source}: {row['duplicate_timestamps']} duplicate timestamps")
+            if row['missing_hours']:
+                issues.append(f"{source}: {row['missing_hours']} missing hours (largest gap {row['largest_gap_hours']} h)")
+
+        for (source, column), row in self.columns.iterrows():
+            if row['missing']:
+                issues.append(f"{source}.{column}: {row['missing']} missing values")
+            if not row['consistent_type']:
+                issues.append(f"{source}.{column}: inconsistent value types ({row['dtype']})")
+            if row['below_range'] or row['above_range']:
+                issues.append(f"{source}.{column}: {row['below_range']} values below and {row['above_range']} above the valid range")
+            if row['flatline']:
+                issues.append(f"{source}.{column}: flat-lined for {row['longest_flatline_hours']} hours")
+
+        return issues
+
+    def is_clean(self) -> bool:
+        return not self.issues()
+
+    def summary(self) -> str:
+        return (f"{len(self.sources)} sources, {int(self.sources['rows'].sum())} rows, "
+                f"{int(self.sources['duplicate_timestamps'].sum())} duplicate timestamps, "
+                f"{int(self.sources['missing_hours'].sum())} missing hours, "
+                f"{int(self.columns['missing'].sum())} missing values, "
+                f"{len(self.issues())} issues")
+
+    @classmethod
+    def combine(cls, reports) -> 'DataQualityReport':
+        """
+        Combines the reports of consecutive chunks. Counts are summed, longest gaps and flat lines are
+        the maxima of the chunks (runs crossing a chunk boundary are counted per chunk).
+        """
+        reports = [report for report in reports if len(report.sources)]
+        if not reports:
+            return check_data_quality({})
+
+        sources = pd.concat([report.sources for report in reports]).groupby(level=0, sort=False).agg({
+            'rows': 'sum', 'start': 'min', 'end': 'max', 'duplicate_timestamps': 'sum',
+            'missing_hours': 'sum', 'largest_gap_hours': 'max'
+        })
+        columns = pd.concat([report.columns for report in reports]).groupby(level=[0, 1], sort=False).agg({
+            'dtype': 'last', 'consistent_type': 'all', 'missing': 'sum', 'below_range': 'sum',
+            'above_range': 'sum', 'longest_flatline_hours': 'max', 'flatline': 'any'
+        })
+
+        return cls(sources, columns)
+
+
+def check_data_quality(data: dict, rules: dict = None) -> DataQualityReport:
+    """
+    Checks all sources in one columnar pass: missing values, value type consistency, duplicate timestamps,
+    holes in the hourly grid, values out of their valid range and flat-lined sensors.
+    Every check is a vectorized NumPy/pandas operation over whole columns.
+    Args:
+        data (dict): Sources keyed by their name, every frame indexed by timestamps.
+        rules (dict): Valid ranges and flat-line limits per column (QUALITY_RULES by default).
+    Returns:
+        DataQualityReport: The structured report.
+    """
+    rules = QUALITY_RULES if rules is None else rules
+    source_rows = {}
+    column_rows = {}
+
+    for source, df in data.items():
+        index = df.index if isinstance(df.index, pd.DatetimeIndex) else pd.DatetimeIndex(pd.to_datetime(df.index))
+        missing_hours, largest_gap = _hourly_gaps(index)
+        source_rows[source] = {
+            'rows': len(df),
+            'start': index.min() if len(index) else pd.NaT,
+            'end': index.max() if len(index) else pd.NaT,
+            'duplicate_timestamps': int(index.duplicated().sum()),
+            'missing_hours': missing_hours,
+            'largest_gap_hours': largest_gap
+        }
+
+        for column in df.columns:
+            column_rows[(source, column)] = _check_column(df[column], rules.get(column, {}))
+
+    sources = pd.DataFrame.from_dict(source_rows, orient='index',
+                                     columns=['rows', 'start', 'end', 'duplicate_timestamps', 'missing_hours', 'largest_gap_hours'])
+    columns = pd.DataFrame.from_dict(column_rows, orient='index',
+                                     columns=['dtype', 'consistent_type', 'missing', 'below_range', 'above_range',
+                                              'longest_flatline_hours', 'flatline'])
+    if column_rows:
+        columns.index = pd.MultiIndex.from_tuples(columns.index, names=['source', 'column'])
+
+    return DataQualityReport(sources, columns)
+
+
+def _hourly_gaps(index: pd.DatetimeIndex) -> tuple:
+    """
+    Returns the number of hours missing in the hourly grid between the first and the last timestamp
+    and the length of the largest gap in hours.
+    """
+    stamps = np.unique(index.to_numpy())
+    if len(stamps) < 2:
+        return 0, 0
+    missing = np.diff(stamps) // np.timedelta64(1, 'h') - 1
+    missing = missing[missing > 0]
+
+    return int(missing.sum()), int(missing.max()) if len(missing) else 0
+
+
+def _check_column(values: pd.Series, rule: dict) -> dict:
+    dtype = values.dtype
+    consistent_type = True
+    if dtype == object:
+        consistent_type = not pd.api.types.infer_dtype(values, skipna=True).startswith('mixed')
+
+    below = above = longest_flatline = 0
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        array = values.to_numpy(dtype='float64', na_value=np.nan)
+        low, high = rule.get('range', (None, None))
+        if low is not None:
+            below = int(np.count_nonzero(array < low))
+        if high is not None:
+            above = int(np.count_nonzero(array > high))
+        if len(array):
+            # Run lengths of identical consecutive values, NaN never continues a run
+            boundaries = np.flatnonzero(np.r_[True, array[1:] != array[:-1], True])
+            longest_flatline = int(np.diff(boundaries).max())
+
+    flatline_hours = rule.get('flatline_hours')
+
+    return {
+        'dtype': str(dtype),
+        'consistent_type': consistent_type,
+        'missing': int(values.isna().sum()),
+        'below_range': below,
+        'above_range': above,
+        'longest_flatline_hours': longest_flatline,
+        'flatline': flatline_hours is not None and longest_flatline > flatline_hours
+    }
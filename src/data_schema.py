@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+MERGED_SCHEMA = {  # Compact dtypes of the merged data, the index is a datetime64 (int64 epoch) DatetimeIndex
+    'consumption': 'float32',
+    'temperature_average': 'float32',
+    'solar_average': 'float32',
+    'wind_average': 'float32',
+    'day_of_week': 'int8',
+    'is_weekend': 'bool',
+    'is_holiday': 'bool',
+    'is_filled': 'bool'
+    }
+
+FEATURE_SCHEMA = {  # Features of the predictor (columns of energy_data) and their compact dtypes
+    'year': 'int16',
+    'month': 'int8',
+    'day': 'int8',
+    'hour': 'int8',
+    **{column: dtype for column, dtype in MERGED_SCHEMA.items() if column not in ('consumption', 'is_filled')}
+    }
+
+
+def apply_schema(data: pd.DataFrame, schema: dict = None) -> pd.DataFrame:
+    """
+    Casts the columns of 'data' present in 'schema' (MERGED_SCHEMA by default) to their compact dtypes
+    and parses an index of timestamp strings into a DatetimeIndex.
+    Calendar fields missing after the alignment are derived from the index (day_of_week, is_weekend)
+    or set to False (is_holiday), because the compact integer and bool dtypes cannot hold NaN.
+    """
+    schema = MERGED_SCHEMA if schema is None else schema
+    if data.index.dtype == object:
+        data = data.set_axis(pd.to_datetime(data.index))
+
+    columns = {}
+    for column, dtype in schema.items():
+        if column not in data.columns:
+            continue
+        values = data[column]
+        if values.dtype == dtype:
+            continue
+        if values.isna().any():
+            if column == 'day_of_week' and isinstance(data.index, pd.DatetimeIndex):
+                values = values.fillna(pd.Series(data.index.dayofweek, index=data.index))
+            elif column == 'is_weekend' and isinstance(data.index, pd.DatetimeIndex):
+                values = values.fillna(pd.Series(data.index.dayofweek >= 5, index=data.index))
+            elif not np.issubdtype(np.dtype(dtype), np.floating):
+                values = values.fillna(False if dtype == 'bool' else 0)
+        columns[column] = values.astype(dtype)
+
+    return data.assign(**columns) if columns else data
+
+
+def memory_report(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the memory footprint of 'data': bytes and dtype per column (the index included),
+    the total and the bytes per year of hourly data.
+    """
+    usage = data.memory_usage(index=True, deep=True)
+    report = pd.DataFrame({
+        'dtype': [str(data.index.dtype), *(str(dtype) for dtype in data.dtypes)],
+        'bytes': usage.to_numpy()
+    }, index=['index', *data.columns])
+    report.loc['total'] = ['', int(report['bytes'].sum())]
+
+    hours = len(data)
+    report['bytes_per_year'] = (report['bytes'] * (365 * 24) / hours).round().astype('int64') if hours else 0
+
+    return report
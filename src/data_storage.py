@@ -0,0 +1,363 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is needed only for the columnar formats
+    pa = None
+
+STORAGE_FORMATS = {  # Supported storage formats with their file extensions
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather'
+    }
+
+STORAGE_FORMAT = 'csv' if pa is None else 'parquet'  # Storage format of data/external and data/processed
+EXPORT_CSV = False  # Also export a ';' separated CSV next to columnar files
+STORAGE_DIRECTORIES = ('data/external', 'data/processed')  # Directories stored in STORAGE_FORMAT
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'  # Timestamps of CSV files, pandas drops the time of all-midnight chunks otherwise
+
+
+def set_storage_format(storage_format, export_csv=None) -> None:
+    """
+    Sets the storage format used by the collectors, the processed data and the database loader.
+    Args:
+        storage_format (str): One of STORAGE_FORMATS.
+        export_csv (bool): If set, enables or disables the additional CSV export of columnar files.
+    """
+    global STORAGE_FORMAT, EXPORT_CSV
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format '{storage_format}', use one of {list(STORAGE_FORMATS)}.")
+    if storage_format != 'csv':
+        _require_pyarrow()
+    STORAGE_FORMAT = storage_format
+    if export_csv is not None:
+        EXPORT_CSV = export_csv
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("The columnar storage formats require 'pyarrow' (pip install pyarrow).")
+
+
+def storage_format_of(path) -> str:
+    """
+    Returns the storage format of a file based on its extension.
+    """
+    extension = os.path.splitext(path)[1]
+    for storage_format, format_extension in STORAGE_FORMATS.items():
+        if extension == format_extension:
+            return storage_format
+    raise ValueError(f"Unknown storage format of the file {path}.")
+
+
+def storage_path(path, storage_format=None) -> str:
+    """
+    Returns 'path' with the extension of the given storage format (STORAGE_FORMAT by default).
+    """
+    storage_format = storage_format or STORAGE_FORMAT
+    return os.path.splitext(path)[0] + STORAGE_FORMATS[storage_format]
+
+
+def convert_csv_files(directories=STORAGE_DIRECTORIES, storage_format=None) -> list:
+    """
+    Converts the ';' separated CSV files of 'directories' to a columnar storage format (STORAGE_FORMAT by default),
+    e.g. the CSV files stored before the columnar default. A CSV file is converted only if its columnar file
+    does not exist yet, so the conversion runs once. The CSV files are kept.
+    Returns the paths of the written files.
+    """
+    storage_format = storage_format or STORAGE_FORMAT
+    if storage_format == 'csv':
+        return []
+
+    written = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            target = storage_path(path, storage_format)
+            if name.endswith(STORAGE_FORMATS['csv']) and not os.path.exists(target):
+                write_frame(read_frame(path), target, export_csv=False)
+                written.append(target)
+
+    return written
+
+
+def write_frame(data, path, export_csv=None) -> None:
+    """
+    Writes a DataFrame with a time index to 'path' in the format given by its extension.
+    Columnar files keep the index as their first column, so they can be read back with read_frame.
+    """
+    storage_format = storage_format_of(path)
+    if storage_format == 'csv':
+        data.to_csv(path, sep=';', date_format=CSV_DATE_FORMAT)
+        return
+
+    _require_pyarrow()
+    table = pa.Table.from_pandas(data.reset_index(), preserve_index=False)
+    if storage_format == 'parquet':
+        pq.write_table(table, path)
+    else:
+        # Uncompressed Arrow IPC can be memory-mapped without decoding
+        feather.write_feather(table, path, compression='uncompressed')
+
+    if EXPORT_CSV if export_csv is None else export_csv:
+        data.to_csv(storage_path(path, 'csv'), sep=';', date_format=CSV_DATE_FORMAT)
+
+
+def append_frame(data, path, export_csv=None) -> None:
+    """
+    Appends rows to a stored frame. CSV files are appended in place (in the stored column order),
+    columnar files are rewritten with the new rows added.
+    """
+    if not os.path.exists(path):
+        write_frame(data, path, export_csv)
+        return
+
+    if storage_format_of(path) == 'csv':
+        with open(path, encoding='utf-8') as f:
+            columns = f.readline().strip().split(';')[1:]
+        data.reindex(columns=columns).to_csv(path, sep=';', mode='a', header=False, date_format=CSV_DATE_FORMAT)
+        return
+
+    stored = read_frame(path, memory_map=False)
+    data = data.reindex(columns=stored.columns)
+    data.index.name = stored.index.name
+    write_frame(pd.concat([stored, data]), path, export_csv)
+
+
+def upsert_frame(data, path, export_csv=None) -> None:
+    """
+    Replaces the stored rows from the first timestamp of 'data' on with 'data' (rows of an overlap window
+    are overwritten, newer rows are appended). CSV files are truncated at the first replaced row, found by
+    reading the file backwards, and appended in place, so only the tail of the file is touched.
+    Columnar files are rewritten with the rows before the first timestamp of 'data'.
+    """
+    if not os.path.exists(path) or data.empty:
+        append_frame(data, path, export_csv)
+        return
+
+    start = data.index[0]
+    if storage_format_of(path) == 'csv':
+        offset = csv_tail_offset(path, start)
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+        append_frame(data, path, export_csv)
+        return
+
+    stored = read_frame(path, memory_map=False)
+    stored = stored[stored.index < start]
+    data = data.reindex(columns=stored.columns)
+    data.index.name = stored.index.name
+    write_frame(pd.concat([stored, data]), path, export_csv)
+
+
+def csv_tail_offset(path, start, block_size=64 * 1024) -> int:
+    """
+    Returns the byte offset of the first row of a time-ordered CSV file whose timestamp is not before 'start'
+    (the file size if there is none). The file is read backwards block by block, up to that row only.
+    """
+    start = pd.Timestamp(start)
+    with open(path, 'rb') as f:
+        header_end = len(f.readline())
+        position = f.seek(0, os.SEEK_END)
+        offset = position
+        rest = b''
+        while position > header_end:
+            size = min(block_size, position - header_end)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + rest).split(b'\n')
+            # The first line of a block can be incomplete, it is completed by the next block
+            rest = lines.pop(0) if position > header_end else b''
+            line_start = position + (len(rest) + 1 if position > header_end else 0)
+            line_starts = []
+            for line in lines:
+                line_starts.append(line_start)
+                line_start += len(line) + 1
+
+            for line, line_start in zip(reversed(lines), reversed(line_starts)):
+                if not line.strip():
+                    continue
+                if pd.Timestamp(line.split(b';', 1)[0].decode('utf-8')) < start:
+                    return offset
+                offset = line_start
+
+    return offset
+
+
+class FrameWriter:
+    """
+    Writes a time-indexed frame chunk by chunk without keeping the written rows in memory.
+    CSV files are appended, Parquet files get one row group and Feather files one record batch per chunk.
+    The schema of the first chunk is used for all following chunks.
+    Methods:
+        write(data):
+            Writes one chunk.
+        close():
+            Finishes the file (also done when used as a context manager).
+    """
+    def __init__(self, path, export_csv=None):
+        self.path = path
+        self.storage_format = storage_format_of(path)
+        self.export_csv = EXPORT_CSV if export_csv is None else export_csv
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._csv_writer = None
+
+    def write(self, data) -> None:
+        if self.storage_format == 'csv':
+            data.to_csv(self.path, sep=';', mode='a' if self.rows else 'w', header=not self.rows, date_format=CSV_DATE_FORMAT)
+            self.rows += len(data)
+            return
+
+        _require_pyarrow()
+        table = pa.Table.from_pandas(data.reset_index(), preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.storage_format == 'parquet':
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema, options=pa.ipc.IpcWriteOptions(compression=None))
+        self._writer.write_table(table.cast(self._schema))
+
+        if self.export_csv:
+            if self._csv_writer is None:
+                self._csv_writer = FrameWriter(storage_path(self.path, 'csv'))
+            self._csv_writer.write(data)
+        self.rows += len(data)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_frame(path, columns=None, start=None, end=None, memory_map=True) -> pd.DataFrame:
+    """
+    Reads a stored frame and returns it with its time index.
+    Args:
+        path (str): File to read, the format is given by its extension.
+        columns (list): Columns to load (projection), None loads all of them.
+        start, end: Optional inclusive bounds of the time index.
+        memory_map (bool): Memory-map columnar files instead of reading them into a buffer.
+    """
+    storage_format = storage_format_of(path)
+    if storage_format == 'csv':
+        with open(path, encoding='utf-8-sig') as f:
+            index_column = f.readline().strip().split(';')[0]
+        usecols = None if columns is None else [index_column, *columns]
+        data = pd.read_csv(path, sep=';', usecols=usecols, parse_dates=[index_column], index_col=index_column)
+        return data.loc[start:end] if start is not None or end is not None else data
+
+    _require_pyarrow()
+    index_column = read_schema(path).names[0]
+    read_columns = None if columns is None else [index_column, *columns]
+
+    if storage_format == 'parquet':
+        filters = []
+        if start is not None:
+            filters.append((index_column, '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append((index_column, '<=', pd.Timestamp(end)))
+        table = pq.read_table(path, columns=read_columns, filters=filters or None, memory_map=memory_map)
+    else:
+        table = feather.read_table(path, columns=read_columns, memory_map=memory_map)
+        if start is not None:
+            table = table.filter(pc.greater_equal(table[index_column], pa.scalar(pd.Timestamp(start), table.schema.field(index_column).type)))
+        if end is not None:
+            table = table.filter(pc.less_equal(table[index_column], pa.scalar(pd.Timestamp(end), table.schema.field(index_column).type)))
+
+    return table.to_pandas().set_index(index_column)
+
+
+def iter_frame(path, chunksize, columns=None):
+    """
+    Reads a stored frame in chunks of at most 'chunksize' rows, each with its time index, so only one chunk
+    is held in memory. Parquet files are read batch by batch, Feather files are memory-mapped.
+    Args:
+        path (str): File to read, the format is given by its extension.
+        chunksize (int): Row budget of one chunk.
+        columns (list): Columns to load (projection), None loads all of them.
+    Yields:
+        pd.DataFrame: Time-ordered chunks of the frame.
+    """
+    storage_format = storage_format_of(path)
+    if storage_format == 'csv':
+        with open(path, encoding='utf-8-sig') as f:
+            index_column = f.readline().strip().split(';')[0]
+        usecols = None if columns is None else [index_column, *columns]
+        with pd.read_csv(path, sep=';', usecols=usecols, parse_dates=[index_column], index_col=index_column,
+                         chunksize=chunksize) as reader:
+            yield from reader
+        return
+
+    _require_pyarrow()
+    index_column = read_schema(path).names[0]
+    read_columns = None if columns is None else [index_column, *columns]
+    if storage_format == 'parquet':
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize, columns=read_columns)
+    else:
+        batches = feather.read_table(path, columns=read_columns, memory_map=True).to_batches(max_chunksize=chunksize)
+    for batch in batches:
+        yield batch.to_pandas().set_index(index_column)
+
+
+def read_schema(path):
+    """
+    Returns the Arrow schema of a columnar file without reading its data.
+    """
+    _require_pyarrow()
+    if storage_format_of(path) == 'parquet':
+        return pq.read_schema(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def read_last_index(path):
+    """
+    Returns the last value of the time index of a stored frame, or None if it has no rows.
+    Only the tail of a CSV file and only the index column of a columnar file is read.
+    """
+    if storage_format_of(path) == 'csv':
+        return _read_last_csv_index(path)
+
+    _require_pyarrow()
+    index_column = read_schema(path).names[0]
+    if storage_format_of(path) == 'parquet':
+        table = pq.read_table(path, columns=[index_column])
+    else:
+        table = feather.read_table(path, columns=[index_column], memory_map=True)
+    if table.num_rows == 0:
+        return None
+
+    return pd.Timestamp(table[index_column][-1].as_py())
+
+
+def _read_last_csv_index(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 4096))
+        lines = f.read().splitlines()
+
+    for line in reversed(lines):
+        if line.strip():
+            try:
+                return pd.Timestamp(line.split(b';', 1)[0].decode('utf-8'))
+            except ValueError:
+                return None  # only the header is stored
+
+    return None
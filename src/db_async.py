@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.data_cache import QueryResultCache
+
+ASYNC_QUERY_WORKERS = 4  # Threads running the blocking queries of AsyncEnergyData
+
+
+class _InFlightQuery:
+    """
+    A started query and the number of requests awaiting it.
+    """
+    def __init__(self):
+        self.future = None
+        self.waiters = 0
+
+
+class AsyncEnergyData:
+    """
+    Asyncio facade of the EnergyDataDB query surface for serving many concurrent clients without blocking
+    the event loop. Queries run on a bounded thread pool, requests beyond its 'max_workers' threads wait
+    in its queue. Identical requests (same method and parameters) arriving while their query is in flight
+    are coalesced, they await the running query instead of starting another one.
+    Cancelling a request cancels its query once no other request awaits it: a queued query is dropped and
+    a running one is interrupted if the database supports it (EnergyDataDB.interrupt), otherwise it finishes
+    and its result is dropped.
+    The query methods of the database (get_* and aggregate) are available as coroutines,
+    e.g. await facade.aggregate('consumption', 'daily').
+    Attributes:
+        database: Thread-safe query backend (EnergyDataDB or ParquetEnergyData).
+        max_workers (int): Number of query threads.
+        queries (int): Number of started queries.
+        coalesced (int): Number of requests served by the query of an identical in-flight request.
+        cancelled (int): Number of queries cancelled because all their requests were cancelled.
+    Methods:
+        call(method, *args, **kwargs):
+            Coroutine running the query method 'method' of the database.
+        stats() -> dict:
+            Returns the counters and the number of queries in flight.
+        close():
+            Cancels the queued queries and shuts the thread pool down.
+    """
+    def __init__(self, database, max_workers=ASYNC_QUERY_WORKERS):
+        self.database = database
+        self.max_workers = max_workers
+        self.queries = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='energy-query')
+        self._in_flight = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'aggregate' or name.startswith('get_'):
+            return functools.partial(self.call, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    async def call(self, method, *args, **kwargs):
+        if not (method == 'aggregate' or method.startswith('get_')):
+            raise ValueError(f"'{method}' is not a query method of the database.")
+        key = QueryResultCache.make_key(method, *args, **kwargs)
+        query = self._in_flight.get(key)
+        if query is None:
+            query = self._in_flight[key] = _InFlightQuery()
+            query.future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self._run, query, functools.partial(getattr(self.database, method), *args, **kwargs))
+            query.future.add_done_callback(functools.partial(self._forget, key, query))
+            self.queries += 1
+        else:
+            self.coalesced += 1
+
+        query.waiters += 1
+        try:
+            # The shield keeps the query running for the other requests when this one is cancelled
+            return await asyncio.shield(query.future)
+        except asyncio.CancelledError:
+            if query.waiters == 1 and not query.future.done():
+                self._cancel(key, query)
+            raise
+        finally:
+            query.waiters -= 1
+
+    def _run(self, query, function):
+        """
+        Runs a query in a pool thread, the thread is recorded to interrupt the query on cancellation.
+        """
+        with self._lock:
+            self._running[query] = threading.get_ident()
+        try:
+            return function()
+        finally:
+            with self._lock:
+                del self._running[query]
+
+    def _forget(self, key, query, future):
+        if self._in_flight.get(key) is query:
+            del self._in_flight[key]
+
+    def _cancel(self, key, query):
+        # Forget the query at once, so a new identical request starts a new query
+        self._forget(key, query, query.future)
+        query.future.cancel()
+        self.cancelled += 1
+        interrupt = getattr(self.database, 'interrupt', None)
+        if interrupt is not None:
+            # Under the lock the thread cannot leave the query and start another one
+            with self._lock:
+                thread_id = self._running.get(query)
+                if thread_id is not None:
+                    interrupt(thread_id)
+
+    def stats(self) -> dict:
+        return {
+            'queries': self.queries,
+            'coalesced': self.coalesced,
+            'cancelled': self.cancelled,
+            'in_flight': len(self._in_flight)
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
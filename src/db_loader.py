@@ -1,63 +1,437 @@
-from datetime import datetime
-import csv
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import functools
+import hashlib
+import os
+import pathlib
 import sqlite3
+import threading
 
-class EnergyDataDB:
-    def __init__(self, db_path="data/database.db", csv_path="data/processed/merged_data.csv"):
+import numpy as np
+import pandas as pd
+
+from src.data_cache import ParsedFrameCache, QueryResultCache
+from src.data_storage import csv_tail_offset, read_frame, storage_format_of, storage_path
+
+REINGEST_WINDOW = timedelta(hours=48)  # Loaded hours reloaded when the processed data changed (incremental processing rewrites them)
+PROCESSED_DTYPES = {  # Column dtypes used to parse the processed CSV file
+    'consumption': 'float64',
+    'temperature_average': 'float64',
+    'solar_average': 'float64',
+    'wind_average': 'float64',
+    'day_of_week': 'int64',
+    'is_weekend': 'bool',
+    'is_holiday': 'bool'
+    }
+BULK_CHUNK_ROWS = 500_000  # Rows parsed and converted at once by the bulk loader
+SCHEMA_VERSION = 6  # PRAGMA user_version of the schema, 2 added the epoch key and the ISO week and day-of-year fields, 3 the rollups, 4 the loaded prefix in ingestion_state, 5 repaired midnight timestamps stored as bare dates, 6 the hourly rollup view
+INDEXES = {  # Secondary indexes of energy_data matching calendar filters and orders (hourly rollup view, ad-hoc queries)
+    'idx_energy_data_calendar': 'year, month, day, hour',
+    'idx_energy_data_iso_week': 'iso_year, iso_week'
+    }
+ROLLUP_METRICS = ('consumption', 'temperature_average', 'solar_average', 'wind_average')  # Columns aggregated in the rollups
+ROLLUPS = {  # Rollups: source table, group keys and carried columns, every level is aggregated from a finer one
+    'hourly': (None, ('year', 'month', 'day', 'hour'), ('iso_year', 'iso_week')),  # A view, energy_data is hourly already
+    'daily': ('energy_data', ('year', 'month', 'day'), ('iso_year', 'iso_week')),
+    'weekly': ('rollup_daily', ('iso_year', 'iso_week'), ()),
+    'monthly': ('rollup_daily', ('year', 'month'), ()),
+    'yearly': ('rollup_monthly', ('year',), ())
+    }
+AGGREGATES = ('sum', 'avg', 'min', 'max', 'count')  # Aggregates stored for every rollup metric
+INGESTION_STATE = ('size', 'mtime_ns', 'sha1', 'max_datetime', 'prefix_size', 'prefix_sha1')  # Ingestion state kept per loaded file
+QUERY_CACHE_ENTRIES = 128  # Query results kept by the LRU cache of EnergyDataDB
+PRAGMAS = {  # Connection settings: WAL journal, fewer fsyncs (safe with WAL) and a 64 MB page cache
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY'
+    }
+READER_PRAGMAS = {  # Settings of the read-only connections, the journal mode is kept by the database file
+    'cache_size': -16 * 1024,
+    'temp_store': 'MEMORY'
+    }
+
+
+def read_processed_data(path, start=None):
+    """
+    Yields the processed data file, or only its rows from 'start' on, as DataFrame chunks indexed by the timestamps.
+    CSV files are parsed column-wise by pandas in chunks of BULK_CHUNK_ROWS, the rows from 'start' on are found
+    by reading the file backwards. Columnar files (Parquet/Feather) are read as one chunk.
+    """
+    if storage_format_of(path) != 'csv':
+        yield read_frame(path, start=start)
+        return
+
+    with open(path, 'rb') as f:
+        fieldnames = f.readline().decode("utf-8").strip().split(';')
+        if start is not None:
+            f.seek(max(f.tell(), csv_tail_offset(path, start)))
+        yield from pd.read_csv(f, sep=';', header=None, names=fieldnames, index_col=fieldnames[0],
+                               dtype=PROCESSED_DTYPES, engine='c', float_precision='round_trip',
+                               chunksize=BULK_CHUNK_ROWS)
+
+
+def loaded_prefix(path, max_datetime) -> tuple:
+    """
+    Returns the size and SHA-1 of the part of a processed data file which a tail reload after loading it up to
+    'max_datetime' keeps: everything before the first row from REINGEST_WINDOW ahead of 'max_datetime' on.
+    For a CSV file these are the bytes up to that row, for a columnar file the rows before it
+    (the size is their number, the hash covers their timestamps and values).
+    Returns (None, None) for an empty file.
+    """
+    if max_datetime is None:
+        return None, None
+    boundary = pd.Timestamp(max_datetime) - REINGEST_WINDOW
+
+    digest = hashlib.sha1()
+    if storage_format_of(path) == 'csv':
+        size = csv_tail_offset(path, boundary)
+        with open(path, 'rb') as f:
+            remaining = size
+            for block in iter(lambda: f.read(min(1024 ** 2, remaining)), b''):
+                digest.update(block)
+                remaining -= len(block)
+        return size, digest.hexdigest()
+
+    data = read_frame(path, end=boundary)
+    data = data[data.index < boundary]
+    digest.update(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+    return len(data), digest.hexdigest()
+
+
+def reingest_start(path, state):
+    """
+    Returns the hour from which a changed processed data file is reloaded, or None if the whole file has to be
+    reloaded: only a file which still starts with the prefix loaded last time (see loaded_prefix) is reloaded
+    from the prefix boundary on, e.g. after rows were appended or the last hours were reprocessed.
+    A corrected older row or a file shortened before the boundary needs a full reload.
+    """
+    if state is None or state['max_datetime'] is None or state.get('prefix_sha1') is None:
+        return None
+    if loaded_prefix(path, state['max_datetime']) != (state['prefix_size'], state['prefix_sha1']):
+        return None
+
+    return datetime.strptime(state['max_datetime'], "%Y-%m-%d %H:%M:%S") - REINGEST_WINDOW
+
+
+class ConnectionPool:
+    """
+    Connections of several threads to one SQLite database in WAL mode: a single writer connection
+    serialized by a lock and a read-only connection per thread. Readers see the last committed data
+    and neither block nor wait for the writer.
+    An in-memory database (':memory:' or '') exists only in the connection which created it, so there the
+    writer connection also serves the reads, which then wait for a running write.
+    Attributes:
+        db_path (str): Path of the database file.
+        in_memory (bool): Whether the database is an in-memory database without reader connections.
+        writer (sqlite3.Connection): The writer connection, to be used only inside write().
+    Methods:
+        write():
+            Context manager holding the writer lock and yielding the writer connection.
+        reader() -> sqlite3.Connection:
+            Returns the read-only connection of the calling thread, opened on first use.
+        read(sql, params) -> list:
+            Runs a query on the reader of the calling thread and returns all rows.
+        data_version() -> int:
+            Returns the SQLite data_version, which changes with every commit of another connection.
+        interrupt(thread_id):
+            Aborts the query running on the reader of a thread.
+        close():
+            Checkpoints the WAL into the database file and closes the writer and all reader connections.
+    """
+    def __init__(self, db_path, pragmas=PRAGMAS, reader_pragmas=READER_PRAGMAS):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
-        self.c = self.conn.cursor()
-        self.create_table()
-        self.load_csv(csv_path)
+        self.in_memory = db_path in (':memory:', '')
+        self.reader_pragmas = reader_pragmas
+        self.writer = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma, value in pragmas.items():
+            self.writer.execute(f"PRAGMA {pragma} = {value}")
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        # Separate reader for PRAGMA data_version, its value is only comparable within one connection
+        self._version_reader = self.writer if self.in_memory else self._connect_reader()
+        self._version_lock = threading.Lock()
 
-    def create_table(self):
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS energy_data (
-            datetime TEXT PRIMARY KEY,
-            year INTEGER,
-            month INTEGER,
-            day INTEGER,
-            hour INTEGER,
-            consumption REAL,
-            temperature_average REAL,
-            solar_average REAL,
-            wind_average REAL,
-            day_of_week INTEGER,
-            is_weekend BOOLEAN,
-            is_holiday BOOLEAN
-        )
-        """)
-        self.conn.commit()
+    def _connect_reader(self) -> sqlite3.Connection:
+        uri = pathlib.Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        # Used only by its thread, check_same_thread=False lets close() run from another one
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for pragma, value in self.reader_pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
 
-    def load_csv(self, csv_path):
-        with open(csv_path, newline='', encoding="utf-8") as f:
-            reader = csv.DictReader(f, delimiter=';')
-            rows = []
-            for row in reader:
-                dt = datetime.strptime(row["datetime"], "%Y-%m-%d %H:%M:%S")
-                rows.append((
-                    row["datetime"],
-                    dt.year,
-                    dt.month,
-                    dt.day,
-                    dt.hour,
-                    float(row["consumption"]),
-                    float(row["temperature_average"]),
-                    float(row["solar_average"]),
-                    float(row["wind_average"]),
-                    int(row["day_of_week"]),
-                    row["is_weekend"] == "True",
-                    row["is_holiday"] == "True"
-                ))
-        self.c.executemany("""
-        INSERT OR REPLACE INTO energy_data
-        (datetime, year, month, day, hour, consumption, temperature_average, solar_average, wind_average, day_of_week, is_weekend, is_holiday)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, rows)
-        self.conn.commit()
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            yield self.writer
+
+    def reader(self) -> sqlite3.Connection:
+        if self.in_memory:
+            return self.writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect_reader()
+            with self._readers_lock:
+                # Close the readers of finished threads
+                alive = {thread.ident for thread in threading.enumerate()}
+                for ident in [ident for ident in self._readers if ident not in alive]:
+                    self._readers.pop(ident).close()
+                previous = self._readers.get(threading.get_ident())
+                if previous is not None:
+                    previous.close()
+                self._readers[threading.get_ident()] = conn
+
+        return conn
+
+    def read(self, sql, params=()) -> list:
+        if self.in_memory:
+            with self._write_lock:
+                return self.writer.execute(sql, params).fetchall()
+        return self.reader().execute(sql, params).fetchall()
+
+    def data_version(self) -> int:
+        with self._version_lock:
+            return self._version_reader.execute("PRAGMA data_version").fetchone()[0]
+
+    def interrupt(self, thread_id) -> None:
+        """
+        Aborts the query running on the reader of the thread 'thread_id' (it raises sqlite3.OperationalError),
+        has no effect if the reader is idle.
+        """
+        with self._readers_lock:
+            conn = self._readers.get(thread_id)
+            if conn is not None:
+                conn.interrupt()
+
+    def close(self) -> None:
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+        if not self.in_memory:
+            self._version_reader.close()
+        with self._write_lock:
+            # Without readers the checkpoint copies the whole WAL and truncates it to zero bytes
+            self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.writer.close()
 
-    def close(self):
-        self.conn.close()
+
+def _writes(method):
+    """
+    Runs an EnergyDataDB method holding the writer lock of its connection pool.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class EnergyDataQueries(ABC):
+    """
+    Query surface of the processed data shared by the storage backends (EnergyDataDB on SQLite,
+    ParquetEnergyData on a partitioned Parquet dataset): the get_* methods and aggregate(), answered from
+    the rollups of ROLLUPS and served from an LRU query cache invalidated by every ingest.
+    A backend implements the abstract methods: the ingestion hooks used by ingest() (read_ingestion_state,
+    write_ingestion_state, replace_data, last_loaded_hour), select_rollup and storage_version.
+    Attributes:
+        data_version (int): Number of ingests by this object.
+        query_cache (QueryResultCache): Cache of the query results.
+    """
+    def __init__(self):
+        self.data_version = 0
+        self.query_cache = QueryResultCache(QUERY_CACHE_ENTRIES)
+
+    def ingest(self, path):
+        """
+        Loads the processed data file 'path' into the storage of the backend, the format is given by the file extension.
+        The size, modification time, content hash and last loaded hour of the file and the size and hash of its
+        loaded prefix (see loaded_prefix) are kept in the ingestion state. Loading is skipped when the file
+        did not change. When only its end changed (appended rows, reprocessed last hours), the stored rows from
+        REINGEST_WINDOW before the last loaded hour on are replaced by the rows of the file. Any other change,
+        e.g. a corrected older row or a shortened file, replaces all stored data by the whole file.
+        The backend runs it holding its write lock.
+        """
+        stat = os.stat(path)
+        state = self.read_ingestion_state(path)
+        if state is not None and (state['size'], state['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return
+
+        sha1 = ParsedFrameCache.content_hash(path)
+        if state is not None and state['sha1'] == sha1:
+            self.write_ingestion_state(path, {**state, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+            return
+
+        start = reingest_start(path, state)
+        rows = self.replace_data(path, start)
+
+        max_datetime = self.last_loaded_hour()
+        prefix_size, prefix_sha1 = loaded_prefix(path, max_datetime)
+        self.write_ingestion_state(path, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': sha1, 'max_datetime': max_datetime,
+                                          'prefix_size': prefix_size, 'prefix_sha1': prefix_sha1})
+        print(f"{rows} rows of {path} loaded" + (f" (from {start})." if start else " (full reload)." if state else "."))
+
+    @abstractmethod
+    def read_ingestion_state(self, path):
+        """
+        Returns the ingestion state of a loaded file as a dict (see INGESTION_STATE), None if it was never loaded.
+        """
+
+    @abstractmethod
+    def write_ingestion_state(self, path, state):
+        """
+        Stores the ingestion state 'state' of the file 'path'.
+        """
+
+    @abstractmethod
+    def replace_data(self, path, start=None) -> int:
+        """
+        Replaces the stored rows from 'start' on by the rows of the processed data file 'path' from 'start' on,
+        or all stored data by the whole file if 'start' is None. Returns the number of loaded rows.
+        """
+
+    @abstractmethod
+    def last_loaded_hour(self):
+        """
+        Returns the newest stored timestamp as 'YYYY-MM-DD HH:MM:SS', None if nothing is stored.
+        """
+
+    @abstractmethod
+    def select_rollup(self, granularity, columns, conditions) -> list:
+        """
+        Returns rollup columns (group keys, carried columns, 'start_epoch' and '<metric>_<aggregate>')
+        as a list of tuples ordered by the group keys, for the groups matching all 'conditions',
+        given as (column, operator, value) with the operators '=', '>=', '<=' and 'in' (a list of values).
+        """
+
+    @abstractmethod
+    def storage_version(self):
+        """
+        Returns a value which changes when another process writes the data.
+        """
+
+    def current_data_version(self) -> tuple:
+        """
+        Returns the version of the data the query results depend on: the ingest counter of this object
+        and the storage_version of the backend, which changes with writes by other processes.
+        """
+        return self.data_version, self.storage_version()
+
+    def _cached(self, key, query):
+        """
+        Returns the result of 'query' (a callable) from the query cache, or runs it and caches the result.
+        Callers get a copy, so modifying a result does not change the cached one.
+        """
+        version = self.current_data_version()
+        result = self.query_cache.get(key, version)
+        if result is None:
+            result = query()
+            self.query_cache.put(key, version, result)
+
+        if isinstance(result, pd.DataFrame):
+            return result.copy()
+        if isinstance(result, dict):
+            return {name: values.copy() for name, values in result.items()}
+        return list(result)
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the hit/miss statistics of the query cache.
+        """
+        return self.query_cache.stats()
+
+    def _rollup_query(self, granularity, columns, year=None, month=None, day=None):
+        """
+        Returns the key columns of a rollup and the given rollup 'columns' as a list of tuples ordered by the keys.
+        The filters apply in the order year, month, day, e.g. 'month' is used only together with 'year'.
+        Results are served from the query cache.
+        """
+        key = self.query_cache.make_key('_rollup_query', granularity, columns, year, month, day)
+        return self._cached(key, lambda: self._run_rollup_query(granularity, columns, year, month, day))
+
+    def _run_rollup_query(self, granularity, columns, year, month, day):
+        keys = ROLLUPS[granularity][1]
+        conditions = []
+        for key, value in (('year', year), ('month', month), ('day', day)):
+            if value is None or key not in keys:
+                break
+            conditions.append((key, '=', value))
+
+        return self.select_rollup(granularity, [*keys, *columns], conditions)
+
+    def aggregate(self, metrics, granularity='daily', filters=None, agg='avg', as_frame=True):
+        """
+        Returns aggregates of several metrics in one query on a rollup table.
+        Args:
+            metrics (str | list): Metric names (see ROLLUP_METRICS).
+            granularity (str): One of ROLLUPS ('hourly', 'daily', 'weekly', 'monthly', 'yearly').
+            filters (dict): Equality filters on the calendar columns of the rollup (e.g. {'year': 2023, 'month': [1, 2]},
+                            a list selects several values) and optional 'start'/'end' bounds of the period start.
+            agg (str | dict): Aggregate of all metrics ('sum', 'avg', 'min', 'max' or 'count'),
+                              or per metric a name or a list of names.
+            as_frame (bool): Return a DataFrame, otherwise a dict of NumPy arrays with the period starts under 'datetime'.
+        Returns:
+            pd.DataFrame: One row per period indexed by its start ('datetime'), one column per metric,
+                          named '<metric>_<agg>' if several aggregates of the metric are requested.
+        Results are served from the query cache.
+        """
+        key = self.query_cache.make_key('aggregate', metrics, granularity, filters, agg, as_frame)
+        return self._cached(key, lambda: self._run_aggregate(metrics, granularity, filters, agg, as_frame))
+
+    def _run_aggregate(self, metrics, granularity, filters, agg, as_frame):
+        metrics = [metrics] if isinstance(metrics, str) else list(metrics)
+        if granularity not in ROLLUPS:
+            raise ValueError(f"Unknown granularity '{granularity}', use one of {list(ROLLUPS)}.")
+        selected = {}
+        for metric in metrics:
+            if metric not in ROLLUP_METRICS:
+                raise ValueError(f"Unknown metric '{metric}', use one of {list(ROLLUP_METRICS)}.")
+            aggs = agg.get(metric, 'avg') if isinstance(agg, dict) else agg
+            aggs = [aggs] if isinstance(aggs, str) else list(aggs)
+            for name in aggs:
+                if name not in AGGREGATES:
+                    raise ValueError(f"Unknown aggregate '{name}', use one of {list(AGGREGATES)}.")
+                selected[metric if len(aggs) == 1 else f"{metric}_{name}"] = f"{metric}_{name}"
+
+        _, keys, carried = ROLLUPS[granularity]
+        conditions = []
+        for column, value in (filters or {}).items():
+            if column in ('start', 'end'):
+                conditions.append(('start_epoch', '>=' if column == 'start' else '<=', int(pd.Timestamp(value).timestamp())))
+            elif column in (*keys, *carried):
+                conditions.append((column, 'in', list(value) if isinstance(value, (list, tuple, set)) else [value]))
+            else:
+                raise ValueError(f"Cannot filter the {granularity} rollup by '{column}'.")
+
+        rows = self.select_rollup(granularity, ['start_epoch', *selected.values()], conditions)
+
+        columns = list(zip(*rows)) if rows else [()] * (len(selected) + 1)
+        starts = self._period_starts(granularity, np.asarray(columns[0], dtype='int64'))
+        # NULL aggregates (no values in the period) become NaN
+        values = {name: np.asarray(column, dtype='int64' if source.endswith('_count') else 'float64')
+                  for (name, source), column in zip(selected.items(), columns[1:])}
+
+        if not as_frame:
+            return {'datetime': starts.to_numpy(), **values}
+        return pd.DataFrame(values, index=starts)
+
+    @staticmethod
+    def _period_starts(granularity, epochs):
+        """
+        Returns the start of the periods containing 'epochs' as a DatetimeIndex named 'datetime'.
+        """
+        index = pd.DatetimeIndex(pd.to_datetime(epochs, unit='s'), name='datetime')
+        if granularity == 'hourly':
+            return index
+        if granularity == 'daily':
+            return index.floor('D')
+        if granularity == 'weekly':
+            return index.floor('D') - pd.to_timedelta(index.dayofweek, unit='D')
+        period = 'M' if granularity == 'monthly' else 'Y'
+        return pd.DatetimeIndex(index.to_period(period).to_timestamp(), name='datetime')
 
     # Time interval total consumption methods
     def get_consumption_per_year(self, year=None):
@@ -65,22 +439,7 @@ class EnergyDataDB:
         Returns total consumption per year as a list of (year, total_consumption) tuples.
         If 'year' is specified, returns total consumption only for that year.
         """
-        if year is not None:
-            self.c.execute("""
-                SELECT year, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year
-                ORDER BY year
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, SUM(consumption) as total_consumption
-                FROM energy_data
-                GROUP BY year
-                ORDER BY year
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('yearly', ['consumption_sum'], year)
     
     def get_consumption_per_month(self, year=None, month=None):
         """
@@ -88,30 +447,7 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns total consumption only for that month.
         If only 'year' is specified, returns total consumption for each month in that year.
         """
-        if year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month
-                ORDER BY year, month
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month
-                ORDER BY year, month
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, SUM(consumption) as total_consumption
-                FROM energy_data
-                GROUP BY year, month
-                ORDER BY year, month
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('monthly', ['consumption_sum'], year, month)
     
     def get_consumption_per_day(self, year=None, month=None, day=None):
         """
@@ -120,38 +456,8 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns total consumption for each day in that month.
         If only 'year' is specified, returns total consumption for each day in that year.
         """
-        if year is not None and month is not None and day is not None:
-            self.c.execute("""
-                SELECT year, month, day, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ? AND day = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year, month, day))
-        elif year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, SUM(consumption) as total_consumption
-                FROM energy_data
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('daily', ['consumption_sum'], year, month, day)
+
     def get_consumption_per_hour(self, year=None, month=None, day=None):
         """
         Returns total consumption per hour as a list of (year, month, day, hour, total_consumption) tuples.
@@ -159,73 +465,21 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns total consumption for each hour of that month.
         If only 'year' is specified, returns total consumption for each hour of that year.
         """
-        if year is not None and month is not None and day is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ? AND day = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month, day))
-        elif year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, SUM(consumption) as total_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, hour, SUM(consumption) as total_consumption
-                FROM energy_data
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """)
-        return self.c.fetchall()    
+        return self._rollup_query('hourly', ['consumption_sum'], year, month, day)
 
     # Time interval average consumption methods
     def get_average_consumption_per_year(self):
         """
         Returns average consumption per year as a list of (year, average_consumption) tuples.
         """
-        self.c.execute("""
-            SELECT year, AVG(consumption) as average_consumption
-            FROM energy_data
-            GROUP BY year
-            ORDER BY year
-        """)
-        return self.c.fetchall()
+        return self._rollup_query('yearly', ['consumption_avg'])
     
     def get_average_consumption_per_month(self, year=None):
         """
         Returns average consumption per month as a list of (year, month, average_consumption) tuples.
         If 'year' is specified, returns average consumption for each month in that year.
         """
-        if year is not None:
-            self.c.execute("""
-                SELECT year, month, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month
-                ORDER BY year, month
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, AVG(consumption) as average_consumption
-                FROM energy_data
-                GROUP BY year, month
-                ORDER BY year, month
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('monthly', ['consumption_avg'], year)
     
     def get_average_consumption_per_day(self, year=None, month=None):
         """
@@ -233,30 +487,7 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns average consumption for each day in that month.
         If only 'year' is specified, returns average consumption for each day in that year.
         """
-        if year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, AVG(consumption) as average_consumption
-                FROM energy_data
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('daily', ['consumption_avg'], year, month)
 
     def get_average_consumption_per_hour(self, year=None, month=None, day=None):
         """
@@ -265,68 +496,19 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns average consumption for each hour of that month.
         If only 'year' is specified, returns average consumption for each hour of that year.
         """
-        if year is not None and month is not None and day is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ? AND day = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month, day))
-        elif year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(consumption) as average_consumption
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(consumption) as average_consumption
-                FROM energy_data
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('hourly', ['consumption_avg'], year, month, day)
     
     def get_average_consumption_per_week(self):
         """
-        Returns average consumption per week (Monday to Sunday) as a list of (week_start_date, average_consumption) tuples.
+        Returns average consumption per ISO week (Monday to Sunday) as a list of (week_start_date, average_consumption) tuples.
         week_start_date is the date (YYYY-MM-DD) of the Monday for each week.
         """
-        self.c.execute("""
-            SELECT 
-                MIN(datetime) as week_start_date,
-                AVG(consumption) as average_consumption
-            FROM (
-                SELECT 
-                    *,
-                    (strftime('%Y-%W', datetime) || '-1') as week_monday
-                FROM energy_data
-            )
-            GROUP BY week_monday
-            ORDER BY week_start_date
-        """)
-        # Convert week_start_date from 'YYYY-WW-1' to 'YYYY-MM-DD'
-        results = []
-        for week_start, avg in self.c.fetchall():
-            # week_start is like '2023-05-1', convert to date
-            try:
-                year, week, _ = week_start.split('-')
-                dt = datetime.strptime(f'{year}-{week}-1', '%Y-%W-%w')
-                results.append((dt.strftime('%Y-%m-%d'), avg))
-            except Exception:
-                results.append((week_start, avg))
-        return results
+        def query():
+            rows = self.select_rollup('weekly', ['start_epoch', 'consumption_avg'], [])
+            starts = self._period_starts('weekly', np.asarray([row[0] for row in rows], dtype='int64'))
+            return list(zip(starts.strftime('%Y-%m-%d').tolist(), (row[1] for row in rows)))
+
+        return self._cached(self.query_cache.make_key('get_average_consumption_per_week'), query)
     
 
 
@@ -335,35 +517,14 @@ class EnergyDataDB:
         """
         Returns average consumption and temperature per year as a list of (year, average_consumption, average_temperature) tuples.
         """
-        self.c.execute("""
-            SELECT year, AVG(consumption) as average_consumption, AVG(temperature_average) as average_temperature
-            FROM energy_data
-            GROUP BY year
-            ORDER BY year
-        """)
-        return self.c.fetchall()
+        return self._rollup_query('yearly', ['consumption_avg', 'temperature_average_avg'])
 
     def get_average_temperature_per_month(self, year=None):
         """
         Returns average consumption and temperature per month as a list of (year, month, average_consumption, average_temperature) tuples.
         If 'year' is specified, returns averages for each month in that year.
         """
-        if year is not None:
-            self.c.execute("""
-                SELECT year, month, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month
-                ORDER BY year, month
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                GROUP BY year, month
-                ORDER BY year, month
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('monthly', ['temperature_average_avg'], year)
 
     def get_average_temperature_per_day(self, year=None, month=None):
         """
@@ -371,30 +532,8 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns averages for each day in that month.
         If only 'year' is specified, returns averages for each day in that year.
         """
-        if year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                GROUP BY year, month, day
-                ORDER BY year, month, day
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('daily', ['temperature_average_avg'], year, month)
+
     def get_average_temperature_per_hour(self, year=None, month=None, day=None):
         """
         Returns average temperature per hour as a list of (year, month, day, hour, average_temperature) tuples.
@@ -402,60 +541,395 @@ class EnergyDataDB:
         If 'year' and 'month' are specified, returns averages for each hour of that month.
         If only 'year' is specified, returns averages for each hour of that year.
         """
-        if year is not None and month is not None and day is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ? AND month = ? AND day = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month, day))
-        elif year is not None and month is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ? AND month = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year, month))
-        elif year is not None:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, day, hour, AVG(temperature_average) as average_temperature
-                FROM energy_data
-                GROUP BY year, month, day, hour
-                ORDER BY year, month, day, hour
-            """)
-        return self.c.fetchall()
+        return self._rollup_query('hourly', ['temperature_average_avg'], year, month, day)
     
     def get_average_solar_per_month(self, year=None):
         """
         Returns average solar radiation per month as a list of (year, month, average_solar) tuples.
         If 'year' is specified, returns averages for each month in that year.
         """
-        if year is not None:
-            self.c.execute("""
-                SELECT year, month, AVG(solar_average) as average_solar
-                FROM energy_data
-                WHERE year = ?
-                GROUP BY year, month
-                ORDER BY year, month
-            """, (year,))
-        else:
-            self.c.execute("""
-                SELECT year, month, AVG(solar_average) as average_solar
-                FROM energy_data
-                GROUP BY year, month
-                ORDER BY year, month
+        return self._rollup_query('monthly', ['solar_average_avg'], year)
+
+
+class EnergyDataDB(EnergyDataQueries):
+    """
+    SQLite database of the processed data with rollup tables for the aggregate queries.
+    It can be shared by several threads: writes (ingestion, schema changes) use the single writer connection
+    of the ConnectionPool and its cursor 'c' under the writer lock, queries run on the read-only connection
+    of the calling thread.
+    """
+    def __init__(self, db_path="data/database.db", csv_path="data/processed/merged_data.csv"):
+        super().__init__()
+        self.db_path = db_path
+        self.pool = ConnectionPool(self.db_path)
+        self.conn = self.pool.writer
+        self.c = self.conn.cursor()
+        self.create_table()
+        self.load_data(storage_path(csv_path))
+
+    @_writes
+    def load_data(self, path):
+        """
+        Loads the processed data file into the database when it changed, see EnergyDataQueries.ingest.
+        """
+        self.ingest(path)
+
+    @_writes
+    def reload_data(self, path="data/processed/merged_data.csv"):
+        """
+        Loads the whole processed data file again, regardless of the ingestion state.
+        """
+        path = storage_path(path)
+        self.c.execute("DELETE FROM ingestion_state WHERE source = ?", (path,))
+        self.conn.commit()
+        self.load_data(path)
+
+    @_writes
+    def read_ingestion_state(self, path):
+        """
+        Returns the ingestion state of 'path' as a dict (see INGESTION_STATE), or None if it was never loaded.
+        """
+        self.c.execute(f"""
+            SELECT {', '.join(INGESTION_STATE)}
+            FROM ingestion_state
+            WHERE source = ?
+        """, (path,))
+        row = self.c.fetchone()
+        if row is None:
+            return None
+        return dict(zip(INGESTION_STATE, row))
+
+    @_writes
+    def write_ingestion_state(self, path, state):
+        self.c.execute(f"""
+        INSERT OR REPLACE INTO ingestion_state
+        (source, {', '.join(INGESTION_STATE)}, loaded_at)
+        VALUES ({', '.join('?' * (len(INGESTION_STATE) + 2))})
+        """, (path, *(state[name] for name in INGESTION_STATE), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        self.conn.commit()
+
+    @_writes
+    def create_table(self):
+        """
+        Creates the tables and indexes, or migrates an older energy_data schema (see SCHEMA_VERSION).
+        energy_data is keyed by the integer epoch of the hour (seconds since 1970-01-01 of the local timestamp),
+        an INTEGER PRIMARY KEY aliases the rowid, so the table is clustered by time without WITHOUT ROWID.
+        """
+        self.c.execute("PRAGMA user_version")
+        version = self.c.fetchone()[0]
+        self.c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'energy_data'")
+        migrate = version < 2 and self.c.fetchone() is not None
+        if migrate:
+            self.c.execute("DROP TABLE IF EXISTS energy_data_v1")
+            self.c.execute("ALTER TABLE energy_data RENAME TO energy_data_v1")
+
+        self.c.execute("""
+        CREATE TABLE IF NOT EXISTS energy_data (
+            epoch INTEGER PRIMARY KEY,
+            datetime TEXT NOT NULL,
+            year INTEGER,
+            month INTEGER,
+            day INTEGER,
+            hour INTEGER,
+            iso_year INTEGER,
+            iso_week INTEGER,
+            day_of_year INTEGER,
+            consumption REAL,
+            temperature_average REAL,
+            solar_average REAL,
+            wind_average REAL,
+            day_of_week INTEGER,
+            is_weekend BOOLEAN,
+            is_holiday BOOLEAN
+        )
+        """)
+        for name, columns in INDEXES.items():
+            self.c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON energy_data ({columns})")
+        if version < 6:
+            # The hourly rollup was a copy of energy_data before it became a view of it
+            self.c.execute("DROP TABLE IF EXISTS rollup_hourly")
+        self.create_rollup_tables()
+        if version < 4:
+            # Without the loaded prefix the next load is a full reload
+            self.c.execute("DROP TABLE IF EXISTS ingestion_state")
+        self.c.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_state (
+            source TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            sha1 TEXT,
+            max_datetime TEXT,
+            prefix_size INTEGER,
+            prefix_sha1 TEXT,
+            loaded_at TEXT
+        )
+        """)
+        if version == 4:
+            # Chunks of only midnight hours were stored as 'YYYY-MM-DD'
+            self.c.execute("UPDATE energy_data SET datetime = datetime || ' 00:00:00' WHERE length(datetime) = 10")
+            self.c.execute("UPDATE ingestion_state SET max_datetime = max_datetime || ' 00:00:00' WHERE length(max_datetime) = 10")
+        self.conn.commit()
+
+        if migrate:
+            df = pd.read_sql_query("SELECT * FROM energy_data_v1", self.conn, index_col='datetime')
+            self.bulk_load(df, defer_indexes=True)
+            self.c.execute("DROP TABLE energy_data_v1")
+            print(f"Migrated {len(df)} rows of energy_data to schema version {SCHEMA_VERSION}.")
+        elif version < 3:
+            with self.conn:
+                self.refresh_rollups()
+        self.c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def query_plan(self, sql, params=()):
+        """
+        Returns the EXPLAIN QUERY PLAN details of a query, e.g. to check that it searches an index.
+        """
+        return [row[-1] for row in self.pool.read(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def create_rollup_tables(self):
+        """
+        Creates the rollup tables (see ROLLUPS). Every rollup row holds the first epoch of its group and the
+        sum, min, max and count of each metric, the average is a virtual column computed from sum and count.
+        The hourly rollup is a view presenting every row of energy_data as a group of one hour, so the hours
+        are stored once and it is read through the primary key and the calendar index of energy_data.
+        """
+        metric_columns = []
+        for metric in ROLLUP_METRICS:
+            metric_columns += [
+                f"{metric}_sum REAL",
+                f"{metric}_min REAL",
+                f"{metric}_max REAL",
+                f"{metric}_count INTEGER",
+                f"{metric}_avg REAL GENERATED ALWAYS AS ({metric}_sum / {metric}_count) VIRTUAL"
+            ]
+        for granularity, (source, keys, carried) in ROLLUPS.items():
+            if source is None:
+                metric_values = [f"{metric} AS {metric}_{name}" for metric in ROLLUP_METRICS for name in ('sum', 'min', 'max')]
+                metric_values += [f"{metric} IS NOT NULL AS {metric}_count" for metric in ROLLUP_METRICS]
+                metric_values += [f"{metric} AS {metric}_avg" for metric in ROLLUP_METRICS]
+                self.c.execute(f"""
+                CREATE VIEW IF NOT EXISTS rollup_{granularity} AS
+                SELECT {', '.join([*keys, *carried, 'epoch AS start_epoch', *metric_values])}
+                FROM energy_data
+                """)
+                continue
+            columns = [f"{key} INTEGER" for key in (*keys, *carried)] + ["start_epoch INTEGER"] + metric_columns
+            self.c.execute(f"""
+            CREATE TABLE IF NOT EXISTS rollup_{granularity} (
+                {', '.join(columns)},
+                PRIMARY KEY ({', '.join(keys)})
+            ) WITHOUT ROWID
             """)
-        return self.c.fetchall()
-    
+            self.c.execute(f"CREATE INDEX IF NOT EXISTS idx_rollup_{granularity}_start ON rollup_{granularity} (start_epoch)")
+
+    @_writes
+    def refresh_rollups(self, first_epoch=None, last_epoch=None):
+        """
+        Recomputes the rollup groups which contain hours between 'first_epoch' and 'last_epoch' (all groups by default).
+        The groups are deleted and aggregated again, so groups whose hours were all deleted disappear.
+        The daily rollup is aggregated from energy_data and every coarser level from the finer one it is built on,
+        so refreshing after an ingest touches only the new hours and the few groups containing them.
+        The hourly rollup is a view of energy_data and needs no refresh.
+        Must run inside the transaction of the ingest.
+        """
+        if first_epoch is None or last_epoch is None:
+            self.c.execute("SELECT MIN(epoch), MAX(epoch) FROM energy_data")
+            first_epoch, last_epoch = self.c.fetchone()
+            if first_epoch is None:
+                return
+
+        for granularity, (source, keys, carried) in ROLLUPS.items():
+            if source is None:
+                continue
+            start, end = self._rollup_range(granularity, first_epoch, last_epoch)
+            if source == 'energy_data':
+                start_column = "epoch"
+                aggregates = [f"SUM({metric}), MIN({metric}), MAX({metric}), COUNT({metric})" for metric in ROLLUP_METRICS]
+            else:
+                start_column = "start_epoch"
+                aggregates = [f"SUM({metric}_sum), MIN({metric}_min), MAX({metric}_max), SUM({metric}_count)" for metric in ROLLUP_METRICS]
+            # Every group lies within the range, so its first hour does as well
+            self.c.execute(f"DELETE FROM rollup_{granularity} WHERE start_epoch BETWEEN ? AND ?", (start, end))
+            columns = [*keys, *carried, "start_epoch"]
+            for metric in ROLLUP_METRICS:
+                columns += [f"{metric}_sum", f"{metric}_min", f"{metric}_max", f"{metric}_count"]
+            self.c.execute(f"""
+            INSERT OR REPLACE INTO rollup_{granularity} ({', '.join(columns)})
+            SELECT {', '.join([*keys, *(f'MIN({column})' for column in carried), f'MIN({start_column})', *aggregates])}
+            FROM {source}
+            WHERE {start_column} BETWEEN ? AND ?
+            GROUP BY {', '.join(keys)}
+            """, (start, end))
+
+    @staticmethod
+    def _rollup_range(granularity, first_epoch, last_epoch):
+        """
+        Returns the epochs of the first and last hour of the rollup groups of 'granularity'
+        which contain the hours from 'first_epoch' to 'last_epoch'.
+        """
+        first = pd.Timestamp(first_epoch, unit='s')
+        last = pd.Timestamp(last_epoch, unit='s')
+        if granularity == 'daily':
+            start, end = first.floor('D'), last.floor('D') + pd.Timedelta(days=1)
+        elif granularity == 'weekly':
+            start = first.floor('D') - pd.Timedelta(days=first.dayofweek)
+            end = last.floor('D') - pd.Timedelta(days=last.dayofweek) + pd.Timedelta(days=7)
+        elif granularity == 'monthly':
+            start, end = first.to_period('M').start_time, last.to_period('M').end_time.ceil('D')
+        else:
+            start, end = first.to_period('Y').start_time, last.to_period('Y').end_time.ceil('D')
+
+        return int(start.timestamp()), int(end.timestamp()) - 1
+
+    @_writes
+    def replace_data(self, path, start=None):
+        """
+        Replaces the stored rows from 'start' on (all rows and rollups without 'start') by the rows of the
+        processed data file from 'start' on, see load_csv and load_columnar. Returns the number of loaded rows.
+        """
+        if storage_format_of(path) == 'csv':
+            return self.load_csv(path, start)
+        return self.load_columnar(path, start)
+
+    @_writes
+    def last_loaded_hour(self):
+        self.c.execute("SELECT MAX(datetime) FROM energy_data")
+        return self.c.fetchone()[0]
+
+    def load_csv(self, csv_path, start=None):
+        """
+        Replaces the stored rows from 'start' on by the rows of the processed CSV file from 'start' on, found by
+        reading the file backwards. Without 'start' the whole file replaces all stored rows and rollups.
+        The file is parsed column-wise by pandas and loaded with bulk_load.
+        Returns the number of loaded rows.
+        """
+        return self.bulk_load(read_processed_data(csv_path, start), defer_indexes=start is None,
+                              replace_from=start, truncate=start is None)
+
+    def load_columnar(self, path, start=None):
+        """
+        Replaces the stored rows from 'start' on by the rows of a columnar (Parquet/Feather) processed data file
+        from 'start' on. Without 'start' the whole file replaces all stored rows and rollups.
+        Returns the number of loaded rows.
+        """
+        return self.bulk_load(read_processed_data(path, start), defer_indexes=start is None,
+                              replace_from=start, truncate=start is None)
+
+    @_writes
+    def bulk_load(self, chunks, defer_indexes=False, replace_from=None, truncate=False):
+        """
+        Upserts processed data into energy_data in one transaction. The calendar parts of the timestamps
+        are derived vectorized and the columns are converted to Python values column by column.
+        Args:
+            chunks: Processed data indexed by its timestamps, a DataFrame or an iterable of DataFrame chunks
+                    (only one chunk is converted at a time).
+            defer_indexes (bool): Drop the secondary indexes of energy_data during the load and rebuild them
+                                  afterwards, which is faster than updating them row by row for large loads.
+            replace_from: If set, the stored rows from this hour on are deleted first, so hours missing in
+                          'chunks' do not survive (e.g. the end of a shortened file).
+            truncate (bool): Delete all stored rows and rollups first.
+        Returns:
+            int: Number of loaded rows.
+        """
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+
+        indexes = []
+        if defer_indexes:
+            self.c.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'energy_data' AND sql IS NOT NULL")
+            indexes = self.c.fetchall()
+
+        loaded = 0
+        first_epoch = last_epoch = None
+        with self.conn:
+            for name, _ in indexes:
+                self.c.execute(f"DROP INDEX {name}")
+            if truncate:
+                self.c.execute("DELETE FROM energy_data")
+                for granularity, (source, _, _) in ROLLUPS.items():
+                    if source is not None:
+                        self.c.execute(f"DELETE FROM rollup_{granularity}")
+            elif replace_from is not None:
+                # The rollups of the deleted hours are refreshed with the loaded ones
+                replace_epoch = int(pd.Timestamp(replace_from).timestamp())
+                self.c.execute("SELECT MIN(epoch), MAX(epoch) FROM energy_data WHERE epoch >= ?", (replace_epoch,))
+                first_epoch, last_epoch = self.c.fetchone()
+                self.c.execute("DELETE FROM energy_data WHERE epoch >= ?", (replace_epoch,))
+            for df in chunks:
+                index = df.index
+                if not isinstance(index, pd.DatetimeIndex):
+                    index = pd.to_datetime(index, format="%Y-%m-%d %H:%M:%S")
+                epochs = index.as_unit('s').asi8
+                self.c.executemany("""
+                INSERT OR REPLACE INTO energy_data
+                (epoch, datetime, year, month, day, hour, iso_year, iso_week, day_of_year,
+                 consumption, temperature_average, solar_average, wind_average, day_of_week, is_weekend, is_holiday)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, self._rows(df, index, epochs))
+                loaded += len(df)
+                if len(epochs):
+                    first_epoch = min(epochs.min(), first_epoch if first_epoch is not None else epochs.min())
+                    last_epoch = max(epochs.max(), last_epoch if last_epoch is not None else epochs.max())
+            for _, sql in indexes:
+                self.c.execute(sql)
+            if first_epoch is not None:
+                self.refresh_rollups(int(first_epoch), int(last_epoch))
+        self.data_version += 1
+
+        return loaded
+
+    @staticmethod
+    def _rows(df, index, epochs):
+        iso = index.isocalendar()
+        return zip(
+            epochs.tolist(),
+            # strftime keeps the time of chunks of only midnight hours, str() drops it
+            index.strftime("%Y-%m-%d %H:%M:%S").tolist(),
+            index.year.tolist(),
+            index.month.tolist(),
+            index.day.tolist(),
+            index.hour.tolist(),
+            iso['year'].astype(int).tolist(),
+            iso['week'].astype(int).tolist(),
+            index.dayofyear.tolist(),
+            *(df[column].astype(float).tolist() for column in ("consumption", "temperature_average", "solar_average", "wind_average")),
+            df["day_of_week"].astype(int).tolist(),
+            df["is_weekend"].astype(bool).tolist(),
+            df["is_holiday"].astype(bool).tolist()
+        )
+
+    def close(self):
+        self.pool.close()
+
+    def storage_version(self) -> int:
+        """
+        Returns the SQLite data_version, which changes with every commit of another connection.
+        """
+        return self.pool.data_version()
+
+    def interrupt(self, thread_id):
+        """
+        Aborts the query running in the thread 'thread_id', see ConnectionPool.interrupt.
+        """
+        self.pool.interrupt(thread_id)
+
+    def select_rollup(self, granularity, columns, conditions) -> list:
+        """
+        Returns 'columns' of the rollup table of 'granularity' ordered by its keys (see EnergyDataQueries).
+        """
+        clauses, params = [], []
+        for column, operator, value in conditions:
+            if operator == 'in':
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params += value
+            else:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
 
-    
\ No newline at end of file
+        return self.pool.read(f"""
+            SELECT {', '.join(columns)}
+            FROM rollup_{granularity}
+            {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+            ORDER BY {', '.join(ROLLUPS[granularity][1])}
+        """, params)
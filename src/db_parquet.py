@@ -0,0 +1,292 @@
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is needed only for the Parquet backend
+    pa = None
+
+from src.data_storage import storage_path
+from src.db_loader import ROLLUP_METRICS, ROLLUPS, EnergyDataQueries, read_processed_data
+
+DATASET_COLUMNS = {  # Columns of the Parquet dataset and their types, year and month are the hive partitions
+    'epoch': 'int64',
+    'day': 'int8',
+    'hour': 'int8',
+    'iso_year': 'int16',
+    'iso_week': 'int8',
+    'consumption': 'float64',
+    'temperature_average': 'float64',
+    'solar_average': 'float64',
+    'wind_average': 'float64',
+    'day_of_week': 'int8',
+    'is_weekend': 'bool',
+    'is_holiday': 'bool',
+    'year': 'int16',
+    'month': 'int8'
+    }
+PARTITIONING = ('year', 'month')  # Partition columns of the dataset (directories year=2023/month=3)
+STATE_FILE = '_ingestion_state.json'  # Ingestion state in the dataset directory, ignored by the dataset discovery
+
+
+class ParquetEnergyData(EnergyDataQueries):
+    """
+    Parquet backend of the EnergyDataDB query surface: the processed data is stored as a local Parquet dataset
+    partitioned by year and month, and the rollups are aggregated when queried. Only the columns a query needs
+    are read (column projection), and only the partitions its calendar filters can match (partition pruning).
+    Ingestion is shared with EnergyDataDB (see EnergyDataQueries.ingest): unchanged files are skipped, files
+    whose loaded prefix is unchanged are reloaded from REINGEST_WINDOW before the last loaded hour on, rewriting
+    only the partitions of the affected months, and any other change replaces the whole dataset.
+    Reads and writes of the dataset hold a lock, so a query never sees a partially rewritten month.
+    Attributes:
+        dataset_path (str): Directory of the dataset.
+        data_version (int): Number of ingests by this object.
+        query_cache (QueryResultCache): Cache of the query results.
+    Methods:
+        load_data(path):
+            Loads the changed part of the processed data file.
+        reload_data(path):
+            Loads the whole processed data file again.
+        replace_data(path, start) -> int:
+            Replaces the stored rows from 'start' on (everything without 'start') by the rows of the file.
+        bulk_load(chunks, replace_from) -> int:
+            Upserts processed data into the dataset.
+        select_rollup(granularity, columns, conditions) -> list:
+            Aggregates the rollup groups matching 'conditions' (see EnergyDataQueries).
+    """
+    def __init__(self, dataset_path="data/processed/energy_data", csv_path="data/processed/merged_data.csv"):
+        if pa is None:
+            raise ImportError("The Parquet backend requires 'pyarrow' (pip install pyarrow).")
+        super().__init__()
+        self.dataset_path = dataset_path
+        self.schema = pa.schema([(column, pa.from_numpy_dtype(np.dtype(dtype))) for column, dtype in DATASET_COLUMNS.items()])
+        self.partitioning = ds.partitioning(pa.schema([self.schema.field(column) for column in PARTITIONING]), flavor='hive')
+        self._lock = threading.RLock()
+        os.makedirs(self.dataset_path, exist_ok=True)
+        self.load_data(storage_path(csv_path))
+
+    def _state_path(self) -> str:
+        return os.path.join(self.dataset_path, STATE_FILE)
+
+    def _dataset(self):
+        return ds.dataset(self.dataset_path, schema=self.schema, format='parquet', partitioning=self.partitioning)
+
+    def load_data(self, path):
+        """
+        Loads the processed data file into the dataset when it changed, see EnergyDataQueries.ingest.
+        """
+        with self._lock:
+            self.ingest(path)
+
+    def reload_data(self, path="data/processed/merged_data.csv"):
+        """
+        Loads the whole processed data file again, regardless of the ingestion state.
+        """
+        path = storage_path(path)
+        with self._lock:
+            states = self._read_states()
+            states.pop(path, None)
+            self._write_states(states)
+            self.load_data(path)
+
+    def _read_states(self) -> dict:
+        try:
+            with open(self._state_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_states(self, states) -> None:
+        tmp_path = f'{self._state_path()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(states, f)
+        os.replace(tmp_path, self._state_path())
+
+    def read_ingestion_state(self, path):
+        """
+        Returns the ingestion state of 'path' as a dict, or None if it was never loaded.
+        """
+        return self._read_states().get(path)
+
+    def write_ingestion_state(self, path, state):
+        states = self._read_states()
+        states[path] = {**state, 'loaded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        self._write_states(states)
+
+    def replace_data(self, path, start=None) -> int:
+        """
+        Replaces the stored rows from 'start' on by the rows of the processed data file from 'start' on.
+        Without 'start' all partitions are deleted and the whole file is loaded.
+        Returns the number of loaded rows.
+        """
+        with self._lock:
+            if start is None:
+                for name in os.listdir(self.dataset_path):
+                    if name.startswith(f'{PARTITIONING[0]}='):
+                        shutil.rmtree(os.path.join(self.dataset_path, name))
+            return self.bulk_load(read_processed_data(path, start), replace_from=start)
+
+    def last_loaded_hour(self):
+        with self._lock:
+            last_epoch = pc.max(self._dataset().to_table(columns=['epoch'])['epoch']).as_py()
+        return None if last_epoch is None else str(pd.Timestamp(last_epoch, unit='s'))
+
+    def bulk_load(self, chunks, replace_from=None) -> int:
+        """
+        Upserts processed data into the dataset. The months of the loaded hours are merged with the rows
+        already stored in their partitions (loaded hours replace stored ones) and their partitions rewritten.
+        Args:
+            chunks: Processed data indexed by its timestamps, a DataFrame or an iterable of DataFrame chunks.
+            replace_from: If set, the stored rows from this hour on are deleted first, so hours missing in
+                          'chunks' do not survive (partitions left without rows are deleted).
+        Returns:
+            int: Number of loaded rows.
+        """
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        frames = [self._frame(df) for df in chunks]
+        frames = [frame for frame in frames if len(frame)]
+        if frames:
+            data = pd.concat(frames, ignore_index=True)
+        else:
+            data = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in DATASET_COLUMNS.items()})
+
+        with self._lock:
+            dataset = self._dataset()
+            months = data[list(PARTITIONING)].drop_duplicates()
+            replace_epoch = None
+            if replace_from is not None:
+                replace_epoch = int(pd.Timestamp(replace_from).timestamp())
+                replaced = dataset.to_table(columns=list(PARTITIONING), filter=ds.field('epoch') >= replace_epoch).to_pandas()
+                months = pd.concat([months, replaced.drop_duplicates()], ignore_index=True).drop_duplicates()
+            if months.empty:
+                return 0
+            months = pd.MultiIndex.from_frame(months)
+
+            stored = dataset.to_table(filter=ds.field('year').isin(months.unique('year').tolist())).to_pandas()
+            stored = stored[pd.MultiIndex.from_frame(stored[list(PARTITIONING)]).isin(months)]
+            if replace_epoch is not None:
+                stored = stored[stored['epoch'] < replace_epoch]
+            data_to_write = (pd.concat([stored, data], ignore_index=True)
+                             .drop_duplicates('epoch', keep='last')
+                             .sort_values('epoch'))
+
+            # Only the written partitions are replaced, the months left without rows are deleted
+            written = pd.MultiIndex.from_frame(data_to_write[list(PARTITIONING)].drop_duplicates())
+            for year, month in months.difference(written):
+                year_path = os.path.join(self.dataset_path, f'year={year}')
+                shutil.rmtree(os.path.join(year_path, f'month={month}'), ignore_errors=True)
+                if os.path.isdir(year_path) and not os.listdir(year_path):
+                    os.rmdir(year_path)
+            if len(data_to_write):
+                ds.write_dataset(pa.Table.from_pandas(data_to_write, schema=self.schema, preserve_index=False),
+                                 self.dataset_path, format='parquet', partitioning=self.partitioning,
+                                 basename_template='part-{i}.parquet', existing_data_behavior='delete_matching')
+            self.data_version += 1
+
+        return len(data)
+
+    @staticmethod
+    def _frame(df) -> pd.DataFrame:
+        """
+        Returns the dataset columns of a processed data chunk, the calendar fields derived from its index.
+        """
+        index = df.index
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.to_datetime(index, format="%Y-%m-%d %H:%M:%S")
+        iso = index.isocalendar()
+        frame = pd.DataFrame({
+            'epoch': index.as_unit('s').asi8,
+            'day': index.day,
+            'hour': index.hour,
+            'iso_year': iso['year'].to_numpy(),
+            'iso_week': iso['week'].to_numpy(),
+            **{column: df[column].to_numpy() for column in ROLLUP_METRICS},
+            'day_of_week': df['day_of_week'].to_numpy(),
+            'is_weekend': df['is_weekend'].to_numpy(),
+            'is_holiday': df['is_holiday'].to_numpy(),
+            'year': index.year,
+            'month': index.month
+        })
+
+        return frame.astype(DATASET_COLUMNS)
+
+    def storage_version(self):
+        """
+        Returns the modification time of the ingestion state, which every load by another process rewrites.
+        """
+        try:
+            return os.stat(self._state_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _filter(conditions):
+        """
+        Returns the dataset filter of the rollup 'conditions'. Conditions on group keys and carried columns hold
+        for every hour of a matching group, so they filter rows (and prune the year/month partitions).
+        Bounds of the period start only prune whole years, because a period can start before its last hours.
+        """
+        expression = None
+        for column, operator, value in conditions:
+            if column == 'start_epoch':
+                year = pd.Timestamp(value, unit='s').year
+                condition = ds.field('year') >= year if operator == '>=' else ds.field('year') <= year + 1
+            else:
+                values = value if operator == 'in' else [value]
+                condition = ds.field(column).isin(values)
+                if column == 'iso_year':
+                    # The first and last days of an ISO year can belong to the neighbouring calendar years
+                    condition &= ds.field('year').isin(sorted({year + shift for year in values for shift in (-1, 0, 1)}))
+            expression = condition if expression is None else expression & condition
+
+        return expression
+
+    def select_rollup(self, granularity, columns, conditions) -> list:
+        """
+        Returns 'columns' of the rollup of 'granularity' ordered by its keys (see EnergyDataQueries),
+        aggregated from the projected columns of the pruned partitions.
+        """
+        _, keys, carried = ROLLUPS[granularity]
+        metrics = [metric for metric in ROLLUP_METRICS if any(column.startswith(f'{metric}_') for column in columns)]
+        with self._lock:
+            table = self._dataset().to_table(columns=list(dict.fromkeys([*keys, *carried, 'epoch', *metrics])),
+                                             filter=self._filter(conditions))
+        data = table.to_pandas()
+
+        groups = data.groupby(list(keys), sort=True)
+        rollup = pd.DataFrame({'start_epoch': groups['epoch'].min(), **{column: groups[column].min() for column in carried}})
+        for metric in metrics:
+            count = groups[metric].count()
+            # SUM of no values is NULL in SQL, not 0
+            total = groups[metric].sum().where(count > 0)
+            rollup[f'{metric}_sum'] = total
+            rollup[f'{metric}_min'] = groups[metric].min()
+            rollup[f'{metric}_max'] = groups[metric].max()
+            rollup[f'{metric}_count'] = count
+            rollup[f'{metric}_avg'] = total / count
+        rollup = rollup.reset_index()
+
+        mask = np.ones(len(rollup), dtype=bool)
+        for column, operator, value in conditions:
+            values = rollup[column]
+            if operator == 'in':
+                mask &= values.isin(value).to_numpy()
+            elif operator == '=':
+                mask &= (values == value).to_numpy()
+            elif operator == '>=':
+                mask &= (values >= value).to_numpy()
+            else:
+                mask &= (values <= value).to_numpy()
+        rollup = rollup[mask]
+
+        # Python values as returned by sqlite3, missing aggregates as None
+        return list(zip(*(rollup[column].astype(object).where(rollup[column].notna(), None).tolist() for column in columns)))